@@ -1,17 +1,158 @@
 import asyncio
+import json
+import logging
 import os
 import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
 
-from fastapi import FastAPI, Query
-from pydantic import BaseModel
+import coloredlogs
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
 # Add src/scripts to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
 
 # Now import the function
-from predict import get_final_predictions
+from batching import BatchScheduler
+from config import (
+    BATCH_WINDOW_MS,
+    CACHE_MAX_DISK_ENTRIES,
+    CACHE_MAX_MEMORY_ENTRIES,
+    CACHE_PATH,
+    CACHE_TTL_S,
+    ENABLE_BATCHING,
+    ENABLE_CACHE,
+    EXECUTOR_MODE,
+    EXECUTOR_WORKERS,
+    FAST_BEAM_SIZE,
+    FIX_JOB_TTL_S,
+    INFERENCE_BACKEND,
+    MAX_BATCH_REQUEST_SIZE,
+    MAX_BATCH_SIZE,
+    MAX_FIX_JOBS,
+    MAX_QUEUE_SIZE,
+    PRELOAD_MODEL,
+    REQUEST_TIMEOUT_S,
+    WARMUP_MODEL,
+)
+from executor import InferenceExecutor, QueueFullError
+from fix_jobs import FixJobStore
+from prediction_cache import PredictionCache, model_fingerprint
+from predict import (
+    DEFAULT_MAX_LENGTH,
+    MODEL_NAME,
+    MODEL_PATH,
+    MODEL_REGISTRY,
+    VALIDATION_POOL,
+    build_input_text,
+    check_predictions,
+    filter_valid_predictions,
+    get_bucketed_batch_predictions,
+    get_final_batch_predictions,
+    get_final_predictions,
+    init_worker,
+    warmup_model,
+)
+from utils import get_memory_breakdown
+from telemetry import (
+    CACHE_LOOKUPS,
+    LOG_FORMAT,
+    REQUEST_ID,
+    REQUEST_SECONDS,
+    REQUESTS,
+    add_request_id_filter,
+    metrics_response,
+    new_request_id,
+)
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+coloredlogs.install(level="INFO", logger=logger, fmt=LOG_FORMAT)
+add_request_id_filter(logger)
+
+DISCONNECT_POLL_INTERVAL_S = 0.5
+# Set by server.py to the launcher's start, before any import. Without it
+# startup is measured from here, after the imports.
+STARTUP_BEGIN = float(os.environ.get("PYTYFIX_STARTUP_BEGIN", time.time()))
+
+inference_executor = InferenceExecutor(
+    EXECUTOR_MODE,
+    EXECUTOR_WORKERS,
+    MAX_QUEUE_SIZE,
+    # Process workers hold their own model replica, threads share the one loaded below
+    initializer=init_worker if EXECUTOR_MODE == "process" else None,
+)
+
+prediction_cache = (
+    PredictionCache(
+        CACHE_PATH,
+        # Quantized and ONNX backends can decode differently from torch
+        f"{INFERENCE_BACKEND}-{model_fingerprint(MODEL_PATH)}",
+        CACHE_MAX_MEMORY_ENTRIES,
+        CACHE_MAX_DISK_ENTRIES,
+        CACHE_TTL_S,
+    )
+    if ENABLE_CACHE
+    else None
+)
+
+fix_jobs = FixJobStore(MAX_FIX_JOBS, FIX_JOB_TTL_S)
+
+
+startup_stats = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model once per process so requests share the same weights
+    if EXECUTOR_MODE == "thread":
+        if WARMUP_MODEL:
+            MODEL_REGISTRY.warmup(MODEL_NAME, MODEL_PATH, warmup_model)
+        elif PRELOAD_MODEL:
+            MODEL_REGISTRY.get(MODEL_NAME, MODEL_PATH)
+    inference_executor.start()
+
+    startup_stats.update(pid=os.getpid(), ready_s=round(time.time() - STARTUP_BEGIN, 3))
+    logger.info(
+        f"Worker {os.getpid()} ready in {startup_stats['ready_s']:.2f} seconds, memory {get_memory_breakdown()}"
+    )
+    yield
+    fix_jobs.shutdown()
+    inference_executor.shutdown()
+    if VALIDATION_POOL is not None:
+        VALIDATION_POOL.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+batch_scheduler = BatchScheduler(
+    get_final_batch_predictions, BATCH_WINDOW_MS, MAX_BATCH_SIZE, inference_executor
+)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    # Every log line written while serving the request carries its id
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    token = REQUEST_ID.set(request_id)
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        # Label by route template so /get-fixes/jobs/{job_id} is one series
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        elapsed = time.perf_counter() - start_time
+        REQUESTS.labels(route_path, str(status)).inc()
+        REQUEST_SECONDS.labels(route_path).observe(elapsed)
+        logger.info(f"{request.method} {route_path} {status} in {elapsed:.3f}s")
+        REQUEST_ID.reset(token)
 
 
 class ModelInput(BaseModel):
@@ -21,30 +162,401 @@ class ModelInput(BaseModel):
     source_code: str
 
 
-async def generate_prediction(input_obj, num_seq, beam_size):
-    # Run the blocking function in a separate thread to avoid blocking the event loop
-    preds = get_final_predictions(
-        data=input_obj.model_dump(),
+class StreamRequest(ModelInput):
+    num_seq: int = Field(10, ge=10, le=50)
+    beam_size: int = Field(10, ge=10, le=50)
+    validate_fixes: bool = Field(False, alias="validate")
+
+
+async def run_generation(data, num_seq, beam_size):
+    if ENABLE_BATCHING:
+        # Concurrent requests with the same settings share one generate call
+        return await batch_scheduler.submit(data, num_seq, beam_size)
+
+    # Run the blocking function on the worker pool to avoid blocking the event loop
+    return await inference_executor.run(
+        get_final_predictions,
+        data=data,
         num_seq=num_seq,
         beam_size=beam_size,
     )
 
+
+async def get_cached_generation(data, num_seq, beam_size):
+    if prediction_cache is None:
+        return await run_generation(data, num_seq, beam_size)
+
+    cache_key = prediction_cache.make_key(
+        build_input_text(data), num_seq, beam_size, DEFAULT_MAX_LENGTH
+    )
+    preds = prediction_cache.get(cache_key)
+    CACHE_LOOKUPS.labels("miss" if preds is None else "hit").inc()
+    if preds is None:
+        start_time = time.time()
+        preds = await run_generation(data, num_seq, beam_size)
+        prediction_cache.put(cache_key, preds, time.time() - start_time)
+    return preds
+
+
+async def generate_prediction(input_obj, num_seq, beam_size, validate=False):
+    preds = await get_cached_generation(input_obj.model_dump(), num_seq, beam_size)
+    if validate:
+        # One Pyre run checks every candidate, keep only those without errors
+        preds = await inference_executor.run(filter_valid_predictions, preds)
+
     return list(preds.values())
 
 
+async def complete_fix_job(job, data, num_seq, beam_size, validate):
+    # Full beam search for a fast request, runs after the fast answer was sent
+    try:
+        with inference_executor.admit():
+            start_time = time.time()
+            preds = await asyncio.wait_for(
+                get_cached_generation(data, num_seq, beam_size), REQUEST_TIMEOUT_S
+            )
+            job.latency["full_s"] = time.time() - start_time
+
+            if validate:
+                start_time = time.time()
+                preds = await inference_executor.run(filter_valid_predictions, preds)
+                job.latency["full_validation_s"] = time.time() - start_time
+    except QueueFullError as e:
+        job.finish(f"Full beam search was not scheduled: {e}")
+    except asyncio.TimeoutError:
+        job.finish(f"Full beam search did not finish within {REQUEST_TIMEOUT_S} seconds")
+    except Exception as e:
+        job.finish(f"Full beam search failed: {e}")
+    else:
+        job.add_predictions(list(preds.values()))
+        job.finish()
+
+
+async def generate_fast_prediction(
+    input_obj, num_seq, beam_size, fast_beam_size, validate=False
+):
+    # Answer with a greedy or small-beam result first, the full beam search
+    # continues in the background and is polled through /get-fixes/jobs
+    data = input_obj.model_dump()
+    latency = {}
+
+    start_time = time.time()
+    preds = await get_cached_generation(data, fast_beam_size, fast_beam_size)
+    latency["fast_s"] = time.time() - start_time
+
+    if validate:
+        start_time = time.time()
+        preds = await inference_executor.run(filter_valid_predictions, preds)
+        latency["fast_validation_s"] = time.time() - start_time
+
+    job = fix_jobs.create(list(preds.values()), latency)
+    job.task = asyncio.create_task(
+        complete_fix_job(job, data, num_seq, beam_size, validate)
+    )
+    return job.to_dict()
+
+
+async def generate_batch_prediction(input_objs, num_seq, beam_size, validate=False):
+    datas = [input_obj.model_dump() for input_obj in input_objs]
+    results: Dict[int, Dict[str, str]] = {}
+    errors: Dict[int, str] = {}
+
+    cache_keys: Dict[int, str] = {}
+    if prediction_cache is not None:
+        for i, data in enumerate(datas):
+            cache_keys[i] = prediction_cache.make_key(
+                build_input_text(data), num_seq, beam_size, DEFAULT_MAX_LENGTH
+            )
+            cached = prediction_cache.get(cache_keys[i])
+            CACHE_LOOKUPS.labels("miss" if cached is None else "hit").inc()
+            if cached is not None:
+                results[i] = cached
+
+    missing = [i for i in range(len(datas)) if i not in results]
+    if missing:
+        start_time = time.time()
+        generated, failed = await inference_executor.run(
+            get_bucketed_batch_predictions,
+            [datas[i] for i in missing],
+            MAX_BATCH_SIZE,
+            num_seq=num_seq,
+            beam_size=beam_size,
+        )
+        compute_time = (time.time() - start_time) / len(missing)
+
+        for j, preds in generated.items():
+            results[missing[j]] = preds
+            if prediction_cache is not None:
+                prediction_cache.put(cache_keys[missing[j]], preds, compute_time)
+        for j, error in failed.items():
+            errors[missing[j]] = error
+
+    if validate and results:
+        # Candidates of every input are validated together by one Pyre run
+        combined = {
+            f"{i}_{pred_id}": code
+            for i, preds in results.items()
+            for pred_id, code in preds.items()
+        }
+        valid = await inference_executor.run(filter_valid_predictions, combined)
+        results = {
+            i: {
+                pred_id: code
+                for pred_id, code in preds.items()
+                if f"{i}_{pred_id}" in valid
+            }
+            for i, preds in results.items()
+        }
+
+    return {
+        "results": {str(i): list(results[i].values()) for i in sorted(results)},
+        "errors": {str(i): errors[i] for i in sorted(errors)},
+    }
+
+
+async def fix_events(input_obj, num_seq, beam_size, validate):
+    # Yields (event, data) pairs: every candidate as soon as it is decoded,
+    # then the Pyre verdict for each candidate once validation finishes
+    try:
+        preds = await asyncio.wait_for(
+            get_cached_generation(input_obj.model_dump(), num_seq, beam_size),
+            REQUEST_TIMEOUT_S,
+        )
+    except asyncio.TimeoutError:
+        yield "error", {
+            "detail": f"Prediction did not finish within {REQUEST_TIMEOUT_S} seconds"
+        }
+        return
+    except Exception as e:
+        logger.exception("Prediction failed")
+        yield "error", {"detail": f"Prediction failed: {e}"}
+        return
+
+    for rank, (pred_id, code) in enumerate(preds.items()):
+        yield "candidate", {"id": pred_id, "rank": rank, "code": code}
+
+    if validate:
+        try:
+            _, errors_by_pred_id = await inference_executor.run(
+                check_predictions, preds
+            )
+        except Exception as e:
+            yield "error", {"detail": f"Validation failed: {e}"}
+        else:
+            for pred_id, errors in errors_by_pred_id.items():
+                yield "validation", {
+                    "id": pred_id,
+                    "valid": not errors,
+                    "errors": [str(error.get("description", "")) for error in errors],
+                }
+
+    yield "done", {"count": len(preds)}
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class SlotStreamingResponse(StreamingResponse):
+    # Releases the executor slot however the response ends. A generator's
+    # finally is not enough: it never runs when the client disconnects
+    # before the body starts
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    # Stop waiting for (and cancel not yet started) work once the client is gone
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL_S)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        task.cancel()
+
+
+async def run_inference(request: Request, coro):
+    try:
+        with inference_executor.admit():
+            return await cancel_on_disconnect(
+                request, asyncio.wait_for(coro, REQUEST_TIMEOUT_S)
+            )
+    except QueueFullError as e:
+        coro.close()
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Prediction did not finish within {REQUEST_TIMEOUT_S} seconds",
+        )
+
+
 @app.get("/")
 def read_root():
     return "Welcome to PyTyFix"
 
 
+@app.get("/health")
+def health():
+    status = MODEL_REGISTRY.health()
+    if EXECUTOR_MODE == "process":
+        # Model replicas live in the worker processes, not in this one
+        status["status"] = "ok"
+    return {
+        **status,
+        "backend": INFERENCE_BACKEND,
+        "startup": {**startup_stats, "memory": get_memory_breakdown()},
+        "executor": inference_executor.stats(),
+        "fix_jobs": fix_jobs.stats(),
+        "cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "validation_pool": (
+            VALIDATION_POOL.stats() if VALIDATION_POOL is not None else None
+        ),
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = metrics_response()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/get-fixes")
 async def get_type_fixes(
+    request: Request,
     input_obj: ModelInput,
     num_seq: int = Query(10, ge=10, le=50),
     beam_size: int = Query(10, ge=10, le=50),
+    validate: bool = Query(False),
+    fast: bool = Query(False),
+    fast_beam_size: int = Query(FAST_BEAM_SIZE, ge=1, le=10),
 ):
+    if fast:
+        return await run_inference(
+            request,
+            generate_fast_prediction(
+                input_obj, num_seq, beam_size, fast_beam_size, validate
+            ),
+        )
+
     # Run multiple tasks concurrently using asyncio.gather
     results = await asyncio.gather(
-        generate_prediction(input_obj, num_seq, beam_size),
+        run_inference(
+            request, generate_prediction(input_obj, num_seq, beam_size, validate)
+        ),
     )
     return results
+
+
+@app.get("/get-fixes/jobs/{job_id}")
+def get_fix_job(job_id: str):
+    job = fix_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job {job_id}")
+    return job.to_dict()
+
+
+@app.post("/get-fixes/batch")
+async def get_batch_type_fixes(
+    request: Request,
+    input_objs: List[ModelInput],
+    num_seq: int = Query(10, ge=10, le=50),
+    beam_size: int = Query(10, ge=10, le=50),
+    validate: bool = Query(False),
+):
+    if len(input_objs) > MAX_BATCH_REQUEST_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_REQUEST_SIZE} inputs are accepted per request, got {len(input_objs)}",
+        )
+
+    return await run_inference(
+        request,
+        generate_batch_prediction(input_objs, num_seq, beam_size, validate),
+    )
+
+
+@app.post("/get-fixes/stream")
+async def stream_type_fixes(
+    input_obj: ModelInput,
+    num_seq: int = Query(10, ge=10, le=50),
+    beam_size: int = Query(10, ge=10, le=50),
+    validate: bool = Query(False),
+):
+    # Reject before the response starts, a 429 cannot be sent mid-stream
+    try:
+        inference_executor.acquire_slot()
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        )
+
+    async def event_stream():
+        # Starlette cancels this generator when the client disconnects
+        try:
+            async for event, data in fix_events(
+                input_obj, num_seq, beam_size, validate
+            ):
+                yield format_sse(event, data)
+        except Exception as e:
+            # Headers are already sent, the failure can only be an event
+            logger.exception("Fix stream failed")
+            yield format_sse("error", {"detail": str(e)})
+
+    return SlotStreamingResponse(
+        event_stream(),
+        inference_executor.release_slot,
+        media_type="text/event-stream",
+    )
+
+
+@app.websocket("/ws/get-fixes")
+async def websocket_type_fixes(websocket: WebSocket):
+    # Each JSON message is one request, answered by a sequence of events
+    await websocket.accept()
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            try:
+                stream_request = StreamRequest.model_validate(payload)
+            except ValidationError as e:
+                await websocket.send_json(
+                    {"event": "error", "data": {"detail": e.errors()}}
+                )
+                continue
+
+            try:
+                inference_executor.acquire_slot()
+            except QueueFullError as e:
+                await websocket.send_json({"event": "error", "data": {"detail": str(e)}})
+                continue
+
+            input_obj = ModelInput(
+                **stream_request.model_dump(include=set(ModelInput.model_fields))
+            )
+            try:
+                async for event, data in fix_events(
+                    input_obj,
+                    stream_request.num_seq,
+                    stream_request.beam_size,
+                    stream_request.validate_fixes,
+                ):
+                    await websocket.send_json({"event": event, "data": data})
+            finally:
+                inference_executor.release_slot()
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,92 @@
+"""
+Prefork launcher: loads the model once in a parent process, then forks
+--workers uvicorn servers that share one listening socket. The workers
+inherit the weights copy-on-write instead of each loading their own.
+
+Run from src/app:
+    python server.py [--host 0.0.0.0] [--port 8000] [--workers 4] [--no-preload]
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+os.environ.setdefault("PYTYFIX_STARTUP_BEGIN", str(time.time()))
+
+import uvicorn
+
+from main import app, logger
+from config import EXECUTOR_MODE
+from predict import MODEL_NAME, MODEL_PATH, MODEL_REGISTRY
+from utils import get_memory_breakdown
+
+
+def preload() -> None:
+    start_time = time.time()
+    MODEL_REGISTRY.get(MODEL_NAME, MODEL_PATH)
+    # Objects allocated so far move to the permanent generation, so the
+    # collector never writes to their headers and the pages stay shared
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        f"Preloaded {MODEL_NAME} in {time.time() - start_time:.2f} seconds, memory {get_memory_breakdown()}"
+    )
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, host: str, port: int) -> None:
+    # Warmup runs here, in lifespan: generating in the parent would start
+    # OpenMP threads, which do not survive a fork
+    config = uvicorn.Config(app, host=host, port=port)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-w", "--workers", type=int, default=2)
+    parser.add_argument("--no-preload", action="store_true")
+    args = parser.parse_args()
+
+    if args.no_preload:
+        pass
+    elif EXECUTOR_MODE == "process":
+        logger.warning("Not preloading, process executor workers load their own model replica.")
+    else:
+        preload()
+
+    sock = bind_socket(args.host, args.port)
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, args.host, args.port)
+            sys.exit(0)
+        children.append(pid)
+    logger.info(f"Started {len(children)} workers on {args.host}:{args.port}: {children}")
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for pid in children:
+        os.waitpid(pid, 0)
+    sock.close()
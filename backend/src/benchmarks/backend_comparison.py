@@ -0,0 +1,106 @@
+"""
+Compares accuracy and latency of the inference backends on a held-out
+PyTy dataset.
+
+Run from src/benchmarks:
+    python backend_comparison.py -d <pyty json> [-b torch torch-int8 onnx] [-n 200]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from data_reader import DataPoint, IterDataAsPython
+from inference_backend import BACKEND_LOADERS
+from predict import (
+    DEFAULT_BEAM_SIZE,
+    DEFAULT_SEQ_NUM,
+    MODEL_NAME,
+    MODEL_PATH,
+    build_input_text,
+    get_single_prediction,
+    load_model_and_tokenizer,
+)
+from utils import get_rss_bytes, is_exact_match
+
+
+def evaluate_backend(
+    backend: str, data_points: List[DataPoint], beam_size: int, num_seq: int
+) -> Dict[str, float]:
+    rss_before = get_rss_bytes()
+    start_time = time.perf_counter()
+    model, tokenizer = load_model_and_tokenizer(MODEL_NAME, MODEL_PATH, backend)
+    load_time = time.perf_counter() - start_time
+
+    latencies = []
+    top1_matches = 0
+    topk_matches = 0
+    for data_point in data_points:
+        input_text = build_input_text(data_point.GetModelInput())
+        start_time = time.perf_counter()
+        predictions = get_single_prediction(
+            model, tokenizer, input_text, beam_size=beam_size, num_seq=num_seq
+        )
+        latencies.append(time.perf_counter() - start_time)
+
+        matches = [is_exact_match(pred, data_point.target_code) for pred in predictions]
+        top1_matches += matches[0]
+        topk_matches += any(matches)
+
+    latencies.sort()
+    samples = len(data_points)
+    return {
+        "samples": samples,
+        "load_time_s": round(load_time, 3),
+        "rss_delta_mb": round((get_rss_bytes() - rss_before) / 2**20, 1),
+        "exact_match@1": round(top1_matches / samples, 4),
+        f"exact_match@{num_seq}": round(topk_matches / samples, 4),
+        "latency_ms_mean": round(1000 * statistics.mean(latencies), 2),
+        "latency_ms_p50": round(1000 * latencies[samples // 2], 2),
+        "latency_ms_p95": round(1000 * latencies[min(samples - 1, int(samples * 0.95))], 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", type=str, required=True)
+    parser.add_argument(
+        "-b",
+        "--backends",
+        nargs="+",
+        choices=list(BACKEND_LOADERS),
+        default=list(BACKEND_LOADERS),
+    )
+    parser.add_argument("-n", "--num-samples", type=int, default=200)
+    parser.add_argument("-r", "--rule-ids", nargs="*", default=None)
+    parser.add_argument("-bm", "--beam-size", type=int, default=DEFAULT_BEAM_SIZE)
+    parser.add_argument("-seq", "--num-seq", type=int, default=DEFAULT_SEQ_NUM)
+    parser.add_argument("-o", "--output", type=str, default="")
+    args = parser.parse_args()
+
+    # Only the evaluated samples are loaded, not the whole dataset
+    data_points = list(
+        itertools.islice(
+            IterDataAsPython(args.dataset, rule_ids=args.rule_ids), args.num_samples
+        )
+    )
+    if not data_points:
+        sys.exit(f"No samples found in {args.dataset}")
+
+    report = {}
+    for backend in args.backends:
+        report[backend] = evaluate_backend(
+            backend, data_points, args.beam_size, args.num_seq
+        )
+        print(backend, json.dumps(report[backend]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,57 @@
+"""
+Measures the memory held per sample by the dataset representations in
+data_reader.py: parsed JSON dicts, DataPoint objects and DataPointTable.
+
+Run from src/benchmarks:
+    python dataset_memory.py -d <pyty json>
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from typing import Callable, Dict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from data_reader import GetDataAsPython, GetDataAsTable
+
+
+def measure(load: Callable[[], object]) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    data = load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples = len(data)
+    return {
+        "samples": samples,
+        "bytes_per_sample": round(current / max(samples, 1)),
+        "peak_mb": round(peak / 2**20, 1),
+    }
+
+
+def load_json(dataset_path: str):
+    with open(dataset_path, "r", errors="ignore") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", type=str, required=True)
+    parser.add_argument("-o", "--output", type=str, default="")
+    args = parser.parse_args()
+
+    report = {
+        "json": measure(lambda: load_json(args.dataset)),
+        "data_points": measure(lambda: GetDataAsPython(args.dataset)),
+        "table": measure(lambda: GetDataAsTable(args.dataset)),
+    }
+    for name, row in report.items():
+        print(name, json.dumps(row))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
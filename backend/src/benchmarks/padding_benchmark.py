@@ -0,0 +1,173 @@
+"""
+Compares encoder cost of fixed padding to max_length (the old behaviour)
+with the dynamic / length-bucketed padding used by predict.py.
+
+Run from src/benchmarks:
+    python padding_benchmark.py [--dataset <pyty json>] [--batch-size 4]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import torch
+
+from data_reader import IterDataAsPython
+from predict import (
+    DEFAULT_MAX_LENGTH,
+    MODEL_NAME,
+    MODEL_PATH,
+    SAMPLE_DATA,
+    bucket_length,
+    build_input_text,
+    encode_text,
+    load_model_and_tokenizer,
+    pad_to_bucket,
+)
+
+
+def estimate_encoder_flops(config, seq_len: int, batch_size: int = 1) -> int:
+    inner_dim = config.num_heads * config.d_kv
+    # q, k, v and output projections
+    projections = 4 * 2 * seq_len * config.d_model * inner_dim
+    # attention scores and the weighted sum of values
+    attention = 2 * 2 * seq_len * seq_len * inner_dim
+    feed_forward = 2 * 2 * seq_len * config.d_model * config.d_ff
+    return batch_size * config.num_layers * (projections + attention + feed_forward)
+
+
+def synthetic_inputs(count: int) -> List[str]:
+    # Grow the sample function body so the inputs cover every length bucket
+    input_texts = []
+    for i in range(count):
+        body = "".join(f"    value_{j} = age + {j}\n" for j in range(i * 2))
+        data = dict(SAMPLE_DATA)
+        data["source_code"] = data["source_code"].replace(
+            "    return (name, age)", body + "    return (name, age)"
+        )
+        input_texts.append(build_input_text(data))
+    return input_texts
+
+
+def dataset_inputs(dataset_path: str) -> List[str]:
+    return [
+        build_input_text(data_point.GetModelInput())
+        for data_point in IterDataAsPython(dataset_path)
+    ]
+
+
+def time_encoder(
+    model, input_ids: torch.Tensor, attention_mask: torch.Tensor, repeats: int
+) -> float:
+    encoder = model.get_encoder()
+    input_ids = input_ids.to(model.device)
+    attention_mask = attention_mask.to(model.device)
+    timings = []
+    with torch.no_grad():
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            encoder(input_ids=input_ids, attention_mask=attention_mask)
+            timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings)
+
+
+def pad_to_max_length(
+    tokenizer, encoded_texts: List[Tuple[int, ...]], max_length: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    input_ids = torch.full(
+        (len(encoded_texts), max_length), tokenizer.pad_token_id, dtype=torch.long
+    )
+    attention_mask = torch.zeros((len(encoded_texts), max_length), dtype=torch.long)
+    for i, ids in enumerate(encoded_texts):
+        input_ids[i, : len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[i, : len(ids)] = 1
+    return input_ids, attention_mask
+
+
+def pad_dynamic(
+    tokenizer, encoded_texts: List[Tuple[int, ...]], max_length: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    # Mirrors predict.py: single inputs are not padded, batches use buckets
+    if len(encoded_texts) == 1:
+        ids = torch.tensor([encoded_texts[0]], dtype=torch.long)
+        return ids, torch.ones_like(ids)
+    return pad_to_bucket(tokenizer, encoded_texts, max_length)
+
+
+def run_benchmark(
+    model, tokenizer, input_texts: List[str], batch_size: int, repeats: int, max_length: int
+) -> Dict[int, Dict[str, float]]:
+    encoded_texts = [encode_text(tokenizer, text, max_length) for text in input_texts]
+
+    # Batches are formed inside each bucket, like get_bucketed_batch_predictions
+    by_bucket: Dict[int, List[Tuple[int, ...]]] = {}
+    for ids in encoded_texts:
+        by_bucket.setdefault(bucket_length(len(ids), max_length), []).append(ids)
+
+    report = {}
+    for bucket, bucket_texts in sorted(by_bucket.items()):
+        before_times, after_times = [], []
+        before_flops, after_flops = 0, 0
+        for i in range(0, len(bucket_texts), batch_size):
+            batch = bucket_texts[i : i + batch_size]
+
+            before_ids, before_mask = pad_to_max_length(tokenizer, batch, max_length)
+            after_ids, after_mask = pad_dynamic(tokenizer, batch, max_length)
+
+            before_times.append(time_encoder(model, before_ids, before_mask, repeats))
+            after_times.append(time_encoder(model, after_ids, after_mask, repeats))
+            before_flops += estimate_encoder_flops(
+                model.config, before_ids.shape[1], len(batch)
+            )
+            after_flops += estimate_encoder_flops(
+                model.config, after_ids.shape[1], len(batch)
+            )
+
+        samples = len(bucket_texts)
+        report[bucket] = {
+            "samples": samples,
+            "gflops_before": round(before_flops / samples / 1e9, 3),
+            "gflops_after": round(after_flops / samples / 1e9, 3),
+            "latency_ms_before": round(1000 * sum(before_times) / samples, 3),
+            "latency_ms_after": round(1000 * sum(after_times) / samples, 3),
+            "speedup": round(sum(before_times) / max(sum(after_times), 1e-9), 2),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", type=str, default="")
+    parser.add_argument("-n", "--num-synthetic", type=int, default=60)
+    parser.add_argument("-bs", "--batch-size", type=int, default=1)
+    parser.add_argument("-r", "--repeats", type=int, default=5)
+    parser.add_argument("-ml", "--max-length", type=int, default=DEFAULT_MAX_LENGTH)
+    parser.add_argument("-o", "--output", type=str, default="")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model_and_tokenizer(MODEL_NAME, MODEL_PATH)
+    input_texts = (
+        dataset_inputs(args.dataset)
+        if args.dataset
+        else synthetic_inputs(args.num_synthetic)
+    )
+
+    report = run_benchmark(
+        model, tokenizer, input_texts, args.batch_size, args.repeats, args.max_length
+    )
+
+    print(f"{'bucket':>8} {'samples':>8} {'GFLOPs before':>14} {'GFLOPs after':>13} "
+          f"{'ms before':>10} {'ms after':>9} {'speedup':>8}")
+    for bucket, row in report.items():
+        print(f"{bucket:>8} {row['samples']:>8} {row['gflops_before']:>14} {row['gflops_after']:>13} "
+              f"{row['latency_ms_before']:>10} {row['latency_ms_after']:>9} {row['speedup']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
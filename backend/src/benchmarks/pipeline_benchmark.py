@@ -0,0 +1,238 @@
+"""
+Benchmarks every stage of the /get-fixes pipeline on fixed inputs and
+emits the timings as JSON, optionally failing on regressions against a
+previous run.
+
+Stages: model_load, tokenization, generation (one entry per beam size),
+postprocess (AST dedup + autopep8), validation (Pyre) and http (round
+trips against a running server under concurrent load).
+
+Run from src/benchmarks:
+    python pipeline_benchmark.py [--stages ...] [--url http://localhost:8000] \
+        [--output run.json] [--baseline previous.json --tolerance 0.2]
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from predict import (
+    DEFAULT_MAX_LENGTH,
+    MODEL_NAME,
+    MODEL_PATH,
+    SAMPLE_DATA,
+    build_input_text,
+    check_predictions,
+    get_single_prediction,
+    load_model_and_tokenizer,
+)
+from validation import PyreCheckError, dedupe_candidates, format_candidate
+
+STAGES = ("model_load", "tokenization", "generation", "postprocess", "validation", "http")
+INPUT_FILES_GLOB = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "others", "Preliminary_Study_T5", "input*.json"
+)
+# The metric compared against the baseline for every stage
+REGRESSION_METRIC = "p50_ms"
+
+
+def load_inputs() -> List[Dict[str, str]]:
+    inputs = [dict(SAMPLE_DATA)]
+    for path in sorted(glob.glob(INPUT_FILES_GLOB)):
+        with open(path, "r") as f:
+            inputs.append(json.load(f))
+    return inputs
+
+
+def summarize_timings(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "mean_ms": round(1000 * statistics.mean(timings), 3),
+        "p50_ms": round(1000 * timings[len(timings) // 2], 3),
+        "p95_ms": round(1000 * timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "min_ms": round(1000 * timings[0], 3),
+    }
+
+
+def time_calls(fn: Callable[[], Any], repeats: int) -> List[float]:
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+def post_fix(url: str, data: Dict[str, str], num_seq: int, beam_size: int) -> None:
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/get-fixes?num_seq={num_seq}&beam_size={beam_size}",
+        data=json.dumps(data).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+
+def benchmark_http(
+    url: str, inputs: List[Dict[str, str]], requests: int, concurrency: int, cached: bool
+) -> Dict[str, float]:
+    def round_trip(i: int) -> float:
+        data = dict(inputs[i % len(inputs)])
+        if not cached:
+            # A distinct comment per request bypasses the server's prediction cache
+            data["source_code"] += f"\n# benchmark request {i}"
+        start_time = time.perf_counter()
+        post_fix(url, data, 10, 10)
+        return time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(round_trip, range(requests)))
+    elapsed = time.perf_counter() - start_time
+    return {
+        **summarize_timings(timings),
+        "concurrency": concurrency,
+        "requests_per_s": round(requests / elapsed, 3),
+    }
+
+
+def run_suite(args) -> Dict[str, Dict[str, Any]]:
+    inputs = load_inputs()
+    input_texts = [build_input_text(data) for data in inputs]
+    results: Dict[str, Dict[str, Any]] = {}
+    model = tokenizer = None
+
+    needs_model = {"model_load", "tokenization", "generation"} & set(args.stages)
+    if needs_model:
+        start_time = time.perf_counter()
+        model, tokenizer = load_model_and_tokenizer(MODEL_NAME, MODEL_PATH)
+        if "model_load" in args.stages:
+            results["model_load"] = summarize_timings([time.perf_counter() - start_time])
+
+    if "tokenization" in args.stages:
+        # Calls the tokenizer directly, encode_text would answer from its cache
+        results["tokenization"] = summarize_timings(
+            time_calls(
+                lambda: [
+                    tokenizer.encode(text, truncation=True, max_length=DEFAULT_MAX_LENGTH)
+                    for text in input_texts
+                ],
+                args.repeats,
+            )
+        )
+
+    # Post-processing and validation use the candidates of the largest beam,
+    # or the input sources when generation is not benchmarked
+    candidates = {str(i): data["source_code"] for i, data in enumerate(inputs)}
+    if "generation" in args.stages:
+        for beam_size in args.beam_sizes:
+            timings = []
+            for text in input_texts:
+                timings += time_calls(
+                    lambda: get_single_prediction(
+                        model, tokenizer, text, DEFAULT_MAX_LENGTH, beam_size, beam_size
+                    ),
+                    args.repeats,
+                )
+            results[f"generation_beam{beam_size}"] = summarize_timings(timings)
+        max_beam_size = max(args.beam_sizes)
+        predictions = get_single_prediction(
+            model, tokenizer, input_texts[0], DEFAULT_MAX_LENGTH, max_beam_size, max_beam_size
+        )
+        candidates = {str(i): prediction for i, prediction in enumerate(predictions)}
+
+    if "postprocess" in args.stages:
+        results["postprocess"] = summarize_timings(
+            time_calls(
+                lambda: [
+                    format_candidate(code)
+                    for code in dedupe_candidates(candidates)[0].values()
+                ],
+                args.repeats,
+            )
+        )
+
+    if "validation" in args.stages:
+        try:
+            results["validation"] = summarize_timings(
+                time_calls(lambda: check_predictions(candidates), args.repeats)
+            )
+        except PyreCheckError as e:
+            results["validation"] = {"skipped": str(e)}
+
+    if "http" in args.stages:
+        if args.url:
+            results["http"] = benchmark_http(
+                args.url, inputs, args.requests, args.concurrency, args.http_cached
+            )
+        else:
+            results["http"] = {"skipped": "no --url given"}
+
+    return results
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    regressions = []
+    for stage, result in results.items():
+        before = baseline.get(stage, {}).get(REGRESSION_METRIC)
+        after = result.get(REGRESSION_METRIC)
+        if before is None or after is None:
+            continue
+        if after > before * (1 + tolerance):
+            regressions.append(
+                f"{stage}: {REGRESSION_METRIC} {before} -> {after} (+{100 * (after / before - 1):.1f}%)"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("-bm", "--beam-sizes", nargs="+", type=int, default=[1, 5, 10])
+    parser.add_argument("-r", "--repeats", type=int, default=5)
+    parser.add_argument("-u", "--url", type=str, default="")
+    parser.add_argument("-n", "--requests", type=int, default=32)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--http-cached", action="store_true")
+    parser.add_argument("-o", "--output", type=str, default="")
+    parser.add_argument("-b", "--baseline", type=str, default="")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "stages": run_suite(args),
+    }
+    print(json.dumps(report["stages"], indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["stages"]
+        regressions = find_regressions(report["stages"], baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.baseline}:", *regressions, sep="\n  ")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Set, Tuple
+
+from executor import InferenceExecutor
+from telemetry import REQUEST_ID
+
+logger = logging.getLogger(__name__)
+
+# (num_seq, beam_size): requests are only batched with identical generation settings
+BatchKey = Tuple[int, int]
+RunBatchFn = Callable[..., List[Dict[str, str]]]
+
+
+class BatchScheduler:
+    """
+    Collects concurrent prediction requests for a short time window and
+    serves each group of compatible requests with one model.generate call.
+    """
+
+    def __init__(
+        self,
+        run_batch: RunBatchFn,
+        window_ms: float,
+        max_batch_size: int,
+        executor: InferenceExecutor,
+    ):
+        self._run_batch = run_batch
+        self._executor = executor
+        self._window = window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._pending: Dict[BatchKey, List[Tuple[Dict[str, str], asyncio.Future, str]]] = {}
+        self._timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+        # Keep references to running batches so they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self, data: Dict[str, str], num_seq: int, beam_size: int
+    ) -> Dict[str, str]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (num_seq, beam_size)
+
+        group = self._pending.setdefault(key, [])
+        group.append((data, future, REQUEST_ID.get()))
+
+        if len(group) >= self._max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self._window, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: BatchKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        group = self._pending.pop(key, [])
+        # Drop callers that gave up while waiting for the window to close
+        group = [request for request in group if not request[1].done()]
+        if group:
+            task = asyncio.get_running_loop().create_task(self._run(key, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            for _, future, _ in group:
+                future.add_done_callback(
+                    lambda _, task=task, group=group: self._cancel_if_abandoned(task, group)
+                )
+
+    @staticmethod
+    def _cancel_if_abandoned(
+        task: asyncio.Task, group: List[Tuple[Dict[str, str], asyncio.Future, str]]
+    ) -> None:
+        # Once every caller timed out or disconnected nobody waits for the
+        # batch: drop it if it is still queued, the executor keeps counting
+        # it against the capacity if it already runs
+        if not task.done() and all(future.done() for _, future, _ in group):
+            task.cancel()
+
+    async def _run(
+        self, key: BatchKey, group: List[Tuple[Dict[str, str], asyncio.Future, str]]
+    ) -> None:
+        num_seq, beam_size = key
+        datas = [data for data, _, _ in group]
+        # Worker logs of a shared batch carry the ids of all its requests
+        REQUEST_ID.set(",".join(request_id for _, _, request_id in group))
+        logger.info(
+            f"Running batch of {len(datas)} requests (num_seq={num_seq}, beam_size={beam_size})"
+        )
+
+        try:
+            results = await self._executor.run(
+                self._run_batch, datas, num_seq=num_seq, beam_size=beam_size
+            )
+        except Exception as e:
+            for _, future, _ in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,76 @@
+import os
+from typing import Final
+
+from utils import boolean_string
+
+# Service settings, overridable through environment variables
+PRELOAD_MODEL: Final[bool] = boolean_string(
+    os.environ.get("PYTYFIX_PRELOAD_MODEL", "True")
+)
+WARMUP_MODEL: Final[bool] = boolean_string(
+    os.environ.get("PYTYFIX_WARMUP_MODEL", "True")
+)
+
+# Cross-request batching of model.generate calls
+ENABLE_BATCHING: Final[bool] = boolean_string(
+    os.environ.get("PYTYFIX_ENABLE_BATCHING", "True")
+)
+BATCH_WINDOW_MS: Final[float] = float(os.environ.get("PYTYFIX_BATCH_WINDOW_MS", "20"))
+MAX_BATCH_SIZE: Final[int] = int(os.environ.get("PYTYFIX_MAX_BATCH_SIZE", "8"))
+
+# Worker pool that runs blocking inference off the event loop
+EXECUTOR_MODE: Final[str] = os.environ.get("PYTYFIX_EXECUTOR_MODE", "thread")
+EXECUTOR_WORKERS: Final[int] = int(os.environ.get("PYTYFIX_EXECUTOR_WORKERS", "1"))
+MAX_QUEUE_SIZE: Final[int] = int(os.environ.get("PYTYFIX_MAX_QUEUE_SIZE", "32"))
+REQUEST_TIMEOUT_S: Final[float] = float(
+    os.environ.get("PYTYFIX_REQUEST_TIMEOUT_S", "120")
+)
+
+# Prediction cache, keyed by normalized input, generation parameters and checkpoint
+ENABLE_CACHE: Final[bool] = boolean_string(
+    os.environ.get("PYTYFIX_ENABLE_CACHE", "True")
+)
+CACHE_PATH: Final[str] = os.environ.get(
+    "PYTYFIX_CACHE_PATH", "prediction_cache.sqlite3"
+)
+CACHE_MAX_MEMORY_ENTRIES: Final[int] = int(
+    os.environ.get("PYTYFIX_CACHE_MAX_MEMORY_ENTRIES", "256")
+)
+CACHE_MAX_DISK_ENTRIES: Final[int] = int(
+    os.environ.get("PYTYFIX_CACHE_MAX_DISK_ENTRIES", "10000")
+)
+CACHE_TTL_S: Final[float] = float(
+    os.environ.get("PYTYFIX_CACHE_TTL_S", str(7 * 24 * 3600))
+)
+
+# Warm Pyre workspaces used to validate candidates, 0 disables the pool
+VALIDATION_POOL_SIZE: Final[int] = int(
+    os.environ.get("PYTYFIX_VALIDATION_POOL_SIZE", "2")
+)
+VALIDATION_WORKSPACE_MAX_USES: Final[int] = int(
+    os.environ.get("PYTYFIX_VALIDATION_WORKSPACE_MAX_USES", "100")
+)
+VALIDATION_HEALTH_CHECK_INTERVAL_S: Final[float] = float(
+    os.environ.get("PYTYFIX_VALIDATION_HEALTH_CHECK_INTERVAL_S", "60")
+)
+VALIDATION_LEASE_TIMEOUT_S: Final[float] = float(
+    os.environ.get("PYTYFIX_VALIDATION_LEASE_TIMEOUT_S", "30")
+)
+
+# Upper bound on the number of inputs accepted by /get-fixes/batch
+MAX_BATCH_REQUEST_SIZE: Final[int] = int(
+    os.environ.get("PYTYFIX_MAX_BATCH_REQUEST_SIZE", "64")
+)
+
+# Inference backend: torch, torch-int8 (dynamic quantization) or onnx (ONNX Runtime)
+INFERENCE_BACKEND: Final[str] = os.environ.get("PYTYFIX_INFERENCE_BACKEND", "torch")
+
+# Fast /get-fixes mode: a small beam answers first, the full beam runs as a background job
+FAST_BEAM_SIZE: Final[int] = int(os.environ.get("PYTYFIX_FAST_BEAM_SIZE", "1"))
+MAX_FIX_JOBS: Final[int] = int(os.environ.get("PYTYFIX_MAX_FIX_JOBS", "256"))
+FIX_JOB_TTL_S: Final[float] = float(os.environ.get("PYTYFIX_FIX_JOB_TTL_S", "300"))
+
+# Load weights without a second, randomly initialized copy (needs accelerate)
+LOW_CPU_MEM_USAGE: Final[bool] = boolean_string(
+    os.environ.get("PYTYFIX_LOW_CPU_MEM_USAGE", "True")
+)
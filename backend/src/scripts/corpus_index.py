@@ -0,0 +1,148 @@
+import argparse
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Final, Optional
+
+from data_reader import IterJsonSamples
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION: Final[int] = 1
+# Not a .json file, so it is never mistaken for a dataset file
+MANIFEST_NAME: Final[str] = ".corpus_manifest"
+
+ManifestEntry = Dict[str, Any]
+
+
+def sample_rule_id(sample: Dict[str, Any]) -> Optional[str]:
+    if "rule_id" in sample:
+        return str(sample["rule_id"])
+    linter_report = sample.get("linter_report")
+    if isinstance(linter_report, dict) and "rule_id" in linter_report:
+        return str(linter_report["rule_id"])
+    return None
+
+
+def index_file(path: str) -> ManifestEntry:
+    # Samples are decoded one at a time, only the header fields are kept
+    project = None
+    samples = 0
+    rule_ids: Counter = Counter()
+    try:
+        for sample in IterJsonSamples(path):
+            if not isinstance(sample, dict):
+                raise ValueError(f"sample {samples} is not a JSON object")
+            if project is None and "project" in sample:
+                project = str(sample["project"])
+            rule_id = sample_rule_id(sample)
+            if rule_id is not None:
+                rule_ids[rule_id] += 1
+            samples += 1
+    except (OSError, ValueError) as e:
+        return {"error": str(e)}
+
+    return {"project": project, "samples": samples, "rule_ids": dict(rule_ids)}
+
+
+def load_manifest(manifest_path: str) -> Dict[str, ManifestEntry]:
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(manifest_path: str, files: Dict[str, ManifestEntry]) -> None:
+    tmp_path = f"{manifest_path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_manifest(
+    directory: str,
+    manifest_path: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, ManifestEntry]:
+    """
+    Returns file name -> {project, samples, rule_ids, size, mtime_ns} for
+    every .json file in directory. Entries of files whose size and mtime
+    are unchanged are reused from the manifest, the rest are indexed in
+    parallel and the manifest is rewritten, unless the directory is not
+    writable.
+    """
+    manifest_path = manifest_path or os.path.join(directory, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+
+    files: Dict[str, ManifestEntry] = {}
+    stale: Dict[str, os.stat_result] = {}
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".json"):
+            continue
+        stat = os.stat(os.path.join(directory, file_name))
+        entry = previous.get(file_name)
+        if (
+            entry is not None
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            files[file_name] = entry
+        else:
+            stale[file_name] = stat
+
+    if stale:
+        start_time = time.time()
+        paths = [os.path.join(directory, file_name) for file_name in stale]
+        if len(paths) == 1 or workers == 1:
+            entries = [index_file(path) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                entries = list(executor.map(index_file, paths))
+
+        for (file_name, stat), entry in zip(stale.items(), entries):
+            if "error" in entry:
+                logger.warning(f"Could not index {file_name}: {entry['error']}")
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            files[file_name] = entry
+        logger.info(
+            f"Indexed {len(stale)} of {len(files)} files in {time.time() - start_time:.2f} seconds."
+        )
+
+    if stale or len(files) != len(previous):
+        try:
+            save_manifest(manifest_path, files)
+        except OSError as e:
+            # Read-only datasets are indexed on every call instead
+            logger.warning(f"Could not write {manifest_path}: {e}")
+    return files
+
+
+if __name__ == "__main__":
+    import coloredlogs
+
+    coloredlogs.install(
+        level="INFO", logger=logger, fmt="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--directory", type=str, required=True)
+    parser.add_argument("-m", "--manifest", type=str, default=None)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    files = build_manifest(args.directory, args.manifest, args.workers)
+    projects = {entry.get("project") for entry in files.values()} - {None}
+    samples = sum(entry.get("samples", 0) for entry in files.values())
+    print(f"{len(files)} files, {len(projects)} projects, {samples} samples")
@@ -1,21 +1,59 @@
 import json
-from typing import Any, List
+import sys
+from array import array
+from typing import Any, Iterable, Iterator, List, Optional, Set, Union
 from typing import Tuple
 from typing import Dict
 
 JsonDict = Dict[str, Any]
 
+# Characters read from the dataset file at a time by IterJsonSamples
+READ_CHUNK_SIZE = 1 << 20
+
+# Stored for numeric fields that are null or empty in the dataset
+MISSING_INT = -1
+
+
+def ToInt(value: Union[str, int, None], field: str = "value") -> int:
+    # Only missing values map to MISSING_INT, anything else that is not an
+    # integer is a corrupt record and raises
+    if value is None or value == "":
+        return MISSING_INT
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError(f"{field} is not an integer: {value!r}")
+
+
+def Intern(value: Optional[str]) -> Optional[str]:
+    # sys.intern only accepts str, null fields stay None
+    return sys.intern(value) if isinstance(value, str) else value
+
 
 class Instruction:
+    __slots__ = (
+        "type",
+        "text",
+        "line_number",
+        "line_column",
+        "global_idx",
+        "description",
+        "relativ_pos",
+    )
+
     def __init__(
         self,
         inst_type: str,
         text: str,
-        line_number: str,
-        line_column: str,
-        global_idx: str,
+        line_number: int,
+        line_column: int,
+        global_idx: int,
         description: str,
-        relativ_pos: str,
+        relativ_pos: int,
     ):
         self.type = inst_type
         self.text = text
@@ -30,15 +68,26 @@ class Instruction:
 
 
 class LinterReport:
+    __slots__ = (
+        "rule_id",
+        "message",
+        "evidence",
+        "col_begin",
+        "col_end",
+        "line_begin",
+        "line_end",
+        "severity",
+    )
+
     def __init__(
         self,
         rule_id: str,
         message: str,
         evidence: str,
-        col_begin: str,
-        col_end: str,
-        line_begin: str,
-        line_end: str,
+        col_begin: int,
+        col_end: int,
+        line_begin: int,
+        line_end: int,
         severity: str,
     ):
         self.rule_id = rule_id
@@ -52,6 +101,21 @@ class LinterReport:
 
 
 class DataPoint:
+    __slots__ = (
+        "source_code",
+        "target_code",
+        "warning_line",
+        "linter_report",
+        "instructions",
+        "source_file",
+        "target_file",
+        "repo",
+        "source_filename",
+        "target_filename",
+        "source_changeid",
+        "target_changeid",
+    )
+
     def __init__(
         self,
         source_code: str,
@@ -118,53 +182,289 @@ class DataPoint:
         outputs = self.target_code + " </s>"
         return inputs, outputs
 
+    def GetModelInput(self) -> Dict[str, str]:
+        # Same fields the /get-fixes endpoint receives from the editor
+        return {
+            "rule_id": self.linter_report.rule_id,
+            "message": self.linter_report.message,
+            "warning_line": self.warning_line,
+            "source_code": self.source_code,
+        }
 
-def GetDataAsPython(data_json_path: str) -> List[DataPoint]:
+
+# converts a data point in json format to a data point in python object
+def FromJsonToPython(sample: JsonDict) -> DataPoint:
+    # Rule ids, severities, instruction types, repos, file names and change
+    # ids repeat across the samples of a dataset, interning keeps one copy
+    linter_report = LinterReport(
+        Intern(sample["linter_report"]["rule_id"]),
+        sample["linter_report"]["message"],
+        sample["linter_report"]["evidence"],
+        ToInt(sample["linter_report"]["col_begin"], "col_begin"),
+        ToInt(sample["linter_report"]["col_end"], "col_end"),
+        ToInt(sample["linter_report"]["line_begin"], "line_begin"),
+        ToInt(sample["linter_report"]["line_end"], "line_end"),
+        Intern(sample["linter_report"]["severity"]),
+    )
+
+    instructions = []
+    for inst in sample["instructions"]:
+        instruction = Instruction(
+            Intern(inst["type"]),
+            inst["text"],
+            ToInt(inst["line_number"], "line_number"),
+            ToInt(inst["line_column"], "line_column"),
+            ToInt(inst["global_idx"], "global_idx"),
+            inst["description"],
+            ToInt(inst["relativ_pos"], "relativ_pos"),
+        )
+        instructions.append(instruction)
+
+    data_point = DataPoint(
+        sample["source_code"],
+        sample["target_code"],
+        sample["warning_line"],
+        linter_report,
+        instructions,
+        Intern(sample["source_file"]),
+        Intern(sample["target_file"]),
+        Intern(sample["repo"]),
+        Intern(sample["source_filename"]),
+        Intern(sample["target_filename"]),
+        Intern(sample["source_changeid"]),
+        Intern(sample["target_changeid"]),
+    )
+
+    return data_point
+
+
+def IterJsonSamples(
+    data_json_path: str, chunk_size: int = READ_CHUNK_SIZE
+) -> Iterator[JsonDict]:
+    # Yields the samples of a JSON array or JSON Lines file one at a time,
+    # only the current sample and one read chunk are kept in memory
+    decoder = json.JSONDecoder()
     with open(data_json_path, "r", errors="ignore") as f:
-        data_json = json.load(f)
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer:
+            return
 
-    # converts a data point in json format to a data point in python object
-    def FromJsonToPython(sample: JsonDict) -> DataPoint:
-        linter_report = LinterReport(
-            sample["linter_report"]["rule_id"],
-            sample["linter_report"]["message"],
-            sample["linter_report"]["evidence"],
-            sample["linter_report"]["col_begin"],
-            sample["linter_report"]["col_end"],
-            sample["linter_report"]["line_begin"],
-            sample["linter_report"]["line_end"],
-            sample["linter_report"]["severity"],
+        if not buffer.startswith("["):
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        pos = 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, pos)
+                sample, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The sample continues in the next chunk, read at least as much
+                # as is buffered so a large sample is not re-parsed too often
+                chunk = f.read(max(chunk_size, len(buffer) - pos))
+                if not chunk:
+                    raise ValueError(f"Unexpected end of JSON array in {data_json_path}")
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield sample
+
+
+def IterDataAsPython(
+    data_json_path: str,
+    rule_ids: Optional[Iterable[str]] = None,
+    repos: Optional[Iterable[str]] = None,
+) -> Iterator[DataPoint]:
+    rule_ids = set(rule_ids) if rule_ids else None
+    repos = set(repos) if repos else None
+
+    for sample in IterJsonSamples(data_json_path):
+        # Filter on the raw sample so skipped samples never become objects
+        if rule_ids is not None and sample["linter_report"]["rule_id"] not in rule_ids:
+            continue
+        if repos is not None and sample["repo"] not in repos:
+            continue
+        yield FromJsonToPython(sample)
+
+
+def GetDataAsPython(
+    data_json_path: str,
+    rule_ids: Optional[Iterable[str]] = None,
+    repos: Optional[Iterable[str]] = None,
+) -> List[DataPoint]:
+    return list(IterDataAsPython(data_json_path, rule_ids, repos))
+
+
+class TextColumn:
+    """
+    The values of one text field, encoded as UTF-8 into a single buffer
+    with the end offset of each value, instead of one str object per row.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("q", [0])
+        # Rows whose value is None
+        self.missing: Set[int] = set()
+
+    def Append(self, value: Optional[str]) -> None:
+        if value is None:
+            self.missing.add(len(self))
+        else:
+            # surrogatepass keeps lone surrogates that JSON escapes can produce
+            self.data += value.encode("utf-8", "surrogatepass")
+        self.offsets.append(len(self.data))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if i in self.missing:
+            return None
+        return self.data[self.offsets[i] : self.offsets[i + 1]].decode(
+            "utf-8", "surrogatepass"
         )
 
-        instructions = []
-        for inst in sample["instructions"]:
-            instruction = Instruction(
-                inst["type"],
-                inst["text"],
-                inst["line_number"],
-                inst["line_column"],
-                inst["global_idx"],
-                inst["description"],
-                inst["relativ_pos"],
-            )
-            instructions.append(instruction)
 
-        data_point = DataPoint(
-            sample["source_code"],
-            sample["target_code"],
-            sample["warning_line"],
+class DataPointTable:
+    """
+    Columnar storage for a whole dataset: free text fields are kept in
+    TextColumns, repeated strings in lists of interned strings, numeric
+    fields in typed arrays and the instructions of all samples in flat
+    columns indexed by offsets. Indexing returns a DataPoint, so
+    GetDescription and GetT5Representation keep working.
+    """
+
+    def __init__(self):
+        self.source_code = TextColumn()
+        self.target_code = TextColumn()
+        self.warning_line = TextColumn()
+        self.source_file: List[str] = []
+        self.target_file: List[str] = []
+        self.repo: List[str] = []
+        self.source_filename: List[str] = []
+        self.target_filename: List[str] = []
+        self.source_changeid: List[str] = []
+        self.target_changeid: List[str] = []
+
+        self.rule_id: List[str] = []
+        self.message = TextColumn()
+        self.evidence = TextColumn()
+        self.severity: List[str] = []
+        self.col_begin = array("q")
+        self.col_end = array("q")
+        self.line_begin = array("q")
+        self.line_end = array("q")
+
+        # Instructions of sample i are rows inst_offsets[i]:inst_offsets[i + 1]
+        self.inst_offsets = array("q", [0])
+        self.inst_type: List[str] = []
+        self.inst_text = TextColumn()
+        self.inst_description = TextColumn()
+        self.inst_line_number = array("q")
+        self.inst_line_column = array("q")
+        self.inst_global_idx = array("q")
+        self.inst_relativ_pos = array("q")
+
+    def Append(self, data_point: DataPoint) -> None:
+        self.source_code.Append(data_point.source_code)
+        self.target_code.Append(data_point.target_code)
+        self.warning_line.Append(data_point.warning_line)
+        self.source_file.append(Intern(data_point.source_file))
+        self.target_file.append(Intern(data_point.target_file))
+        self.repo.append(Intern(data_point.repo))
+        self.source_filename.append(Intern(data_point.source_filename))
+        self.target_filename.append(Intern(data_point.target_filename))
+        self.source_changeid.append(Intern(data_point.source_changeid))
+        self.target_changeid.append(Intern(data_point.target_changeid))
+
+        linter_report = data_point.linter_report
+        self.rule_id.append(Intern(linter_report.rule_id))
+        self.message.Append(linter_report.message)
+        self.evidence.Append(linter_report.evidence)
+        self.severity.append(Intern(linter_report.severity))
+        self.col_begin.append(ToInt(linter_report.col_begin))
+        self.col_end.append(ToInt(linter_report.col_end))
+        self.line_begin.append(ToInt(linter_report.line_begin))
+        self.line_end.append(ToInt(linter_report.line_end))
+
+        for inst in data_point.instructions:
+            self.inst_type.append(Intern(inst.type))
+            self.inst_text.Append(inst.text)
+            self.inst_description.Append(inst.description)
+            self.inst_line_number.append(ToInt(inst.line_number))
+            self.inst_line_column.append(ToInt(inst.line_column))
+            self.inst_global_idx.append(ToInt(inst.global_idx))
+            self.inst_relativ_pos.append(ToInt(inst.relativ_pos))
+        self.inst_offsets.append(len(self.inst_type))
+
+    def __len__(self) -> int:
+        return len(self.source_code)
+
+    def __getitem__(self, i: int) -> DataPoint:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("DataPointTable index out of range")
+
+        linter_report = LinterReport(
+            self.rule_id[i],
+            self.message[i],
+            self.evidence[i],
+            self.col_begin[i],
+            self.col_end[i],
+            self.line_begin[i],
+            self.line_end[i],
+            self.severity[i],
+        )
+        instructions = [
+            Instruction(
+                self.inst_type[j],
+                self.inst_text[j],
+                self.inst_line_number[j],
+                self.inst_line_column[j],
+                self.inst_global_idx[j],
+                self.inst_description[j],
+                self.inst_relativ_pos[j],
+            )
+            for j in range(self.inst_offsets[i], self.inst_offsets[i + 1])
+        ]
+        return DataPoint(
+            self.source_code[i],
+            self.target_code[i],
+            self.warning_line[i],
             linter_report,
             instructions,
-            sample["source_file"],
-            sample["target_file"],
-            sample["repo"],
-            sample["source_filename"],
-            sample["target_filename"],
-            sample["source_changeid"],
-            sample["target_changeid"],
+            self.source_file[i],
+            self.target_file[i],
+            self.repo[i],
+            self.source_filename[i],
+            self.target_filename[i],
+            self.source_changeid[i],
+            self.target_changeid[i],
         )
 
-        return data_point
+    def __iter__(self) -> Iterator[DataPoint]:
+        for i in range(len(self)):
+            yield self[i]
+
 
-    data = [FromJsonToPython(sample) for sample in data_json]
-    return data
+def GetDataAsTable(
+    data_json_path: str,
+    rule_ids: Optional[Iterable[str]] = None,
+    repos: Optional[Iterable[str]] = None,
+) -> DataPointTable:
+    table = DataPointTable()
+    for data_point in IterDataAsPython(data_json_path, rule_ids, repos):
+        table.Append(data_point)
+    return table
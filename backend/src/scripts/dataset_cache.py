@@ -0,0 +1,248 @@
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+from typing import IO, Any, Dict, Final, List, Tuple
+
+from data_reader import IterDataAsPython
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION: Final[int] = 1
+TOKEN_TYPECODE: Final[str] = "i"  # int32, enough for the T5 vocabulary
+OFFSET_TYPECODE: Final[str] = "q"
+TOKENIZE_BATCH_SIZE: Final[int] = 1000
+ARRAY_FILES: Final[Dict[str, str]] = {
+    "input_ids": TOKEN_TYPECODE,
+    "input_offsets": OFFSET_TYPECODE,
+    "target_ids": TOKEN_TYPECODE,
+    "target_offsets": OFFSET_TYPECODE,
+}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tokenizer_version(tokenizer) -> str:
+    # Changes whenever the tokenizer class, library version or vocabulary does
+    import transformers
+
+    parts = [type(tokenizer).__name__, transformers.__version__, str(len(tokenizer))]
+    vocab_file = getattr(tokenizer, "vocab_file", None)
+    if vocab_file and os.path.isfile(vocab_file):
+        parts.append(file_sha256(vocab_file))
+    else:
+        parts.append(str(tokenizer.name_or_path))
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def cache_key(data_json_path: str, tokenizer, include_warning: bool) -> str:
+    stat = os.stat(data_json_path)
+    parts = [
+        str(CACHE_FORMAT_VERSION),
+        os.path.abspath(data_json_path),
+        str(stat.st_size),
+        str(stat.st_mtime_ns),
+        tokenizer_version(tokenizer),
+        str(include_warning),
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def cache_path(cache_dir: str, data_json_path: str, key: str) -> str:
+    name = os.path.splitext(os.path.basename(data_json_path))[0]
+    return os.path.join(cache_dir, f"{name}-{key}")
+
+
+def tokenize_texts(tokenizer, texts: List[str]) -> List[List[int]]:
+    # GetT5Representation already ends every text with </s>
+    return tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+
+def close_files(files: Dict[str, IO[bytes]]) -> None:
+    for f in files.values():
+        f.close()
+
+
+def compile_dataset(
+    data_json_path: str, tokenizer, include_warning: bool, cache_dir: str
+) -> str:
+    key = cache_key(data_json_path, tokenizer, include_warning)
+    output_dir = cache_path(cache_dir, data_json_path, key)
+    if os.path.isfile(os.path.join(output_dir, "meta.json")):
+        return output_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".compiling-", dir=cache_dir)
+    start_time = time.time()
+    files = {}
+    try:
+        for name in ARRAY_FILES:
+            files[name] = open(os.path.join(tmp_dir, f"{name}.bin"), "wb")
+        input_offsets = array(OFFSET_TYPECODE, [0])
+        target_offsets = array(OFFSET_TYPECODE, [0])
+
+        def flush(inputs: List[str], targets: List[str]) -> None:
+            # Samples are tokenized in batches and appended, the dataset is
+            # never held in memory as a whole
+            for ids in tokenize_texts(tokenizer, inputs):
+                array(TOKEN_TYPECODE, ids).tofile(files["input_ids"])
+                input_offsets.append(input_offsets[-1] + len(ids))
+            for ids in tokenize_texts(tokenizer, targets):
+                array(TOKEN_TYPECODE, ids).tofile(files["target_ids"])
+                target_offsets.append(target_offsets[-1] + len(ids))
+
+        inputs, targets = [], []
+        for data_point in IterDataAsPython(data_json_path):
+            input_text, target_text = data_point.GetT5Representation(include_warning)
+            inputs.append(input_text)
+            targets.append(target_text)
+            if len(inputs) == TOKENIZE_BATCH_SIZE:
+                flush(inputs, targets)
+                inputs, targets = [], []
+        if inputs:
+            flush(inputs, targets)
+
+        input_offsets.tofile(files["input_offsets"])
+        target_offsets.tofile(files["target_offsets"])
+        close_files(files)
+
+        meta = {
+            "format_version": CACHE_FORMAT_VERSION,
+            "dataset": os.path.abspath(data_json_path),
+            "tokenizer": str(tokenizer.name_or_path),
+            "tokenizer_version": tokenizer_version(tokenizer),
+            "include_warning": include_warning,
+            "samples": len(input_offsets) - 1,
+            "byteorder": sys.byteorder,
+            "typecodes": ARRAY_FILES,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        # Readers only ever see a complete cache directory
+        os.replace(tmp_dir, output_dir)
+    except BaseException:
+        close_files(files)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(
+        f"Compiled {meta['samples']} samples to {output_dir} in {time.time() - start_time:.2f} seconds."
+    )
+    return output_dir
+
+
+class TokenizedDataset:
+    """
+    Read-only view of a compiled dataset. The token id files are memory
+    mapped, and input_ids / target_ids return memoryview slices of the
+    mapping, so reading a sample copies nothing.
+
+    close() unmaps the files right away only when no slice is referenced
+    any more, otherwise a mapping is unmapped once its last slice is gone.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was compiled on a {self.meta['byteorder']}-endian machine")
+
+        self.path = path
+        self._maps: List[mmap.mmap] = []
+        self._views: List[memoryview] = []
+        self._arrays: Dict[str, memoryview] = {}
+        for name, typecode in self.meta["typecodes"].items():
+            self._arrays[name] = self._map_array(os.path.join(path, f"{name}.bin"), typecode)
+
+    def _map_array(self, path: str, typecode: str) -> memoryview:
+        if os.path.getsize(path) == 0:
+            # mmap refuses empty files
+            return memoryview(array(typecode))
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        raw = memoryview(mapped)
+        typed = raw.cast(typecode)
+        self._maps.append(mapped)
+        self._views.extend((typed, raw))
+        return typed
+
+    def __len__(self) -> int:
+        return self.meta["samples"]
+
+    def _slice(self, name: str, i: int) -> memoryview:
+        if not 0 <= i < len(self):
+            raise IndexError("TokenizedDataset index out of range")
+        offsets = self._arrays[name.replace("ids", "offsets")]
+        return self._arrays[name][offsets[i] : offsets[i + 1]]
+
+    def input_ids(self, i: int) -> memoryview:
+        return self._slice("input_ids", i)
+
+    def target_ids(self, i: int) -> memoryview:
+        return self._slice("target_ids", i)
+
+    def __getitem__(self, i: int) -> Tuple[memoryview, memoryview]:
+        return self.input_ids(i), self.target_ids(i)
+
+    def close(self) -> None:
+        # Only the views created here are released, slices handed out to
+        # callers stay valid and keep their mapping alive
+        self._arrays.clear()
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # Still exported by a caller's slice, unmapped when it is freed
+                pass
+        self._maps, self._views = [], []
+
+    def __enter__(self) -> "TokenizedDataset":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def load_tokenized_dataset(
+    data_json_path: str, tokenizer, include_warning: bool, cache_dir: str
+) -> TokenizedDataset:
+    # Compiles on the first use, later runs with the same dataset, tokenizer
+    # and include_warning flag map the existing cache
+    return TokenizedDataset(
+        compile_dataset(data_json_path, tokenizer, include_warning, cache_dir)
+    )
+
+
+if __name__ == "__main__":
+    import coloredlogs
+    from transformers import T5Tokenizer
+
+    coloredlogs.install(
+        level="INFO", logger=logger, fmt="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", type=str, required=True)
+    parser.add_argument("-o", "--cache-dir", type=str, default="dataset_cache")
+    parser.add_argument("-t", "--tokenizer", type=str, default="../utils/t5base_final/")
+    parser.add_argument("--no-warning", action="store_true")
+    args = parser.parse_args()
+
+    tokenizer = T5Tokenizer.from_pretrained(args.tokenizer)
+    print(compile_dataset(args.dataset, tokenizer, not args.no_warning, args.cache_dir))
@@ -0,0 +1,315 @@
+"""
+Batch evaluation of the fixer on a PyTy dataset: exact match@k per rule_id,
+throughput, latency percentiles and peak RSS.
+
+Per-sample results are appended to --output as JSON Lines after every batch,
+so an interrupted run resumes where it stopped. --num-shards / --shard-index
+split the dataset for separate runs, --processes runs the shards in local
+worker processes and merges their results. With --cache-dir, token ids are
+read from a compiled dataset cache (see dataset_cache.py) instead of
+tokenizing every sample.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import coloredlogs
+
+from data_reader import DataPoint, IterDataAsPython
+from dataset_cache import load_tokenized_dataset
+from utils import get_peak_rss_bytes, is_exact_match
+
+logger = logging.getLogger(__name__)
+coloredlogs.install(
+    level="INFO", logger=logger, fmt="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# Samples read ahead and sorted by length before they are split into batches
+SORT_WINDOW_BATCHES = 8
+
+EvalRecord = Dict[str, Any]
+
+
+def load_checkpoint(output_path: str) -> Dict[int, EvalRecord]:
+    records = {}
+    if not os.path.isfile(output_path):
+        return records
+    with open(output_path, "r") as f:
+        lines = f.readlines()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        records[record["index"]] = record
+
+    if lines and not lines[-1].endswith("\n"):
+        # The last line is cut short when a run is killed mid-write, drop it
+        # so new records are not appended to it
+        with open(output_path, "rb+") as f:
+            f.truncate(os.path.getsize(output_path) - len(lines[-1].encode()))
+    return records
+
+
+def iter_shard(
+    data_json_path: str,
+    num_shards: int,
+    shard_index: int,
+    done: Iterable[int],
+    rule_ids: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Tuple[int, DataPoint]]:
+    # Indexes are positions in the unfiltered dataset, so they stay valid
+    # across resumed runs and match the rows of a compiled dataset cache
+    done = set(done)
+    rule_ids = set(rule_ids) if rule_ids else None
+    for index, data_point in enumerate(IterDataAsPython(data_json_path)):
+        if limit is not None and index >= limit:
+            return
+        if index % num_shards != shard_index or index in done:
+            continue
+        if rule_ids is None or data_point.linter_report.rule_id in rule_ids:
+            yield index, data_point
+
+
+def length_sorted_batches(
+    samples: Iterator[Tuple[int, DataPoint]], batch_size: int
+) -> Iterator[List[Tuple[int, DataPoint]]]:
+    # Sorting a bounded window keeps batches of similar length, so little
+    # padding is generated, without loading the whole dataset
+    window: List[Tuple[int, DataPoint]] = []
+
+    def flush():
+        window.sort(key=lambda sample: len(sample[1].source_code))
+        for i in range(0, len(window), batch_size):
+            yield window[i : i + batch_size]
+        window.clear()
+
+    for sample in samples:
+        window.append(sample)
+        if len(window) == batch_size * SORT_WINDOW_BATCHES:
+            yield from flush()
+    yield from flush()
+
+
+def truncate_ids(ids, max_length: int, eos_token_id: int) -> Tuple[int, ...]:
+    # Same result as encode_text: at most max_length ids, ending with </s>
+    if len(ids) <= max_length:
+        return tuple(ids)
+    return tuple(ids[: max_length - 1]) + (eos_token_id,)
+
+
+def first_match_rank(predictions: List[str], target: str) -> Optional[int]:
+    for rank, prediction in enumerate(predictions):
+        if is_exact_match(prediction, target):
+            return rank
+    return None
+
+
+def evaluate_shard(
+    data_json_path: str,
+    output_path: str,
+    num_shards: int,
+    shard_index: int,
+    batch_size: int,
+    beam_size: int,
+    num_seq: int,
+    rule_ids: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    cache_dir: str = "",
+) -> Dict[str, float]:
+    # Imported here so --processes workers load torch and the model themselves
+    from predict import (
+        DEFAULT_MAX_LENGTH,
+        MODEL_NAME,
+        MODEL_PATH,
+        build_input_text,
+        get_batch_predictions,
+        get_batch_predictions_from_ids,
+        get_model_and_tokenizer,
+    )
+
+    done = load_checkpoint(output_path)
+    if done:
+        logger.info(f"Resuming shard {shard_index} with {len(done)} finished samples.")
+
+    model, tokenizer = get_model_and_tokenizer(MODEL_NAME, MODEL_PATH)
+    tokenized = (
+        load_tokenized_dataset(data_json_path, tokenizer, True, cache_dir)
+        if cache_dir
+        else None
+    )
+
+    processed = 0
+    start_time = time.time()
+    with open(output_path, "a") as f:
+        samples = iter_shard(data_json_path, num_shards, shard_index, done, rule_ids, limit)
+        for batch in length_sorted_batches(samples, batch_size):
+            batch_start = time.time()
+            if tokenized is not None:
+                batch_predictions = get_batch_predictions_from_ids(
+                    model,
+                    tokenizer,
+                    [
+                        truncate_ids(
+                            tokenized.input_ids(index),
+                            DEFAULT_MAX_LENGTH,
+                            tokenizer.eos_token_id,
+                        )
+                        for index, _ in batch
+                    ],
+                    DEFAULT_MAX_LENGTH,
+                    beam_size,
+                    num_seq,
+                )
+            else:
+                batch_predictions = get_batch_predictions(
+                    model,
+                    tokenizer,
+                    [build_input_text(data_point.GetModelInput()) for _, data_point in batch],
+                    DEFAULT_MAX_LENGTH,
+                    beam_size,
+                    num_seq,
+                )
+            # Latency of a sample is its share of the batch generate call
+            latency = (time.time() - batch_start) / len(batch)
+
+            for (index, data_point), predictions in zip(batch, batch_predictions):
+                record = {
+                    "index": index,
+                    "rule_id": data_point.linter_report.rule_id,
+                    "first_match": first_match_rank(predictions, data_point.target_code),
+                    "latency_s": round(latency, 6),
+                }
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+
+            processed += len(batch)
+            logger.info(f"Shard {shard_index}: {len(done) + processed} samples evaluated.")
+
+    elapsed = time.time() - start_time
+    if tokenized is not None:
+        tokenized.close()
+    return {
+        "processed": processed,
+        "elapsed_s": elapsed,
+        "peak_rss_bytes": get_peak_rss_bytes(),
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(records: Iterable[EvalRecord], ks: List[int]) -> Dict[str, Any]:
+    by_rule_id: Dict[str, List[Optional[int]]] = defaultdict(list)
+    latencies = []
+    for record in records:
+        by_rule_id[record["rule_id"]].append(record["first_match"])
+        latencies.append(record["latency_s"])
+
+    def exact_match(ranks: List[Optional[int]]) -> Dict[str, float]:
+        return {
+            f"exact_match@{k}": round(
+                sum(rank is not None and rank < k for rank in ranks) / len(ranks), 4
+            )
+            for k in ks
+        }
+
+    all_ranks = [rank for ranks in by_rule_id.values() for rank in ranks]
+    latencies.sort()
+    return {
+        "samples": len(all_ranks),
+        **(exact_match(all_ranks) if all_ranks else {}),
+        "latency_ms_p50": round(1000 * percentile(latencies, 0.5), 2),
+        "latency_ms_p95": round(1000 * percentile(latencies, 0.95), 2),
+        "rule_ids": {
+            rule_id: {"samples": len(ranks), **exact_match(ranks)}
+            for rule_id, ranks in sorted(by_rule_id.items())
+        },
+    }
+
+
+def shard_output_path(output_path: str, shard_index: int, num_shards: int) -> str:
+    if num_shards == 1:
+        return output_path
+    return f"{output_path}.shard{shard_index}-of-{num_shards}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", type=str, required=True)
+    parser.add_argument("-o", "--output", type=str, default="eval_results.jsonl")
+    parser.add_argument("-r", "--report", type=str, default="")
+    parser.add_argument("-bs", "--batch-size", type=int, default=8)
+    parser.add_argument("-bm", "--beam-size", type=int, default=10)
+    parser.add_argument(
+        "-seq", "--num-seq", type=int, default=10
+    )  # number of seq to generate, must be <= number of beams
+    parser.add_argument("-et", "--rule-ids", nargs="*", default=None)
+    parser.add_argument("-n", "--limit", type=int, default=None)
+    parser.add_argument("-ns", "--num-shards", type=int, default=1)
+    parser.add_argument("-si", "--shard-index", type=int, default=None)
+    parser.add_argument("-p", "--processes", type=int, default=1)
+    parser.add_argument("-c", "--cache-dir", type=str, default="")
+    args = parser.parse_args()
+
+    if args.processes > 1:
+        # Run every shard in its own process, each with its own model replica
+        num_shards = args.processes
+        shard_indexes = list(range(num_shards))
+    else:
+        num_shards = args.num_shards
+        shard_indexes = (
+            [args.shard_index] if args.shard_index is not None else list(range(num_shards))
+        )
+
+    jobs = [
+        (
+            args.dataset,
+            shard_output_path(args.output, shard_index, num_shards),
+            num_shards,
+            shard_index,
+            args.batch_size,
+            args.beam_size,
+            args.num_seq,
+            args.rule_ids,
+            args.limit,
+            args.cache_dir,
+        )
+        for shard_index in shard_indexes
+    ]
+
+    start_time = time.time()
+    if args.processes > 1:
+        with ProcessPoolExecutor(
+            max_workers=args.processes, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            runs = list(executor.map(evaluate_shard, *zip(*jobs)))
+    else:
+        runs = [evaluate_shard(*job) for job in jobs]
+    elapsed = time.time() - start_time
+
+    records: Dict[int, EvalRecord] = {}
+    for job in jobs:
+        records.update(load_checkpoint(job[1]))
+
+    ks = sorted({k for k in (1, 5, 10, args.num_seq) if k <= args.num_seq})
+    report = summarize(records.values(), ks)
+    processed = sum(run["processed"] for run in runs)
+    report["samples_per_s"] = round(processed / elapsed, 3) if elapsed > 0 else 0.0
+    report["peak_rss_bytes"] = max(run["peak_rss_bytes"] for run in runs)
+
+    print(json.dumps({k: v for k, v in report.items() if k != "rule_ids"}, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
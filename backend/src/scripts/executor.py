@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from telemetry import REQUEST_ID, call_with_request_id
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("thread", "process")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class InferenceExecutor:
+    """
+    Runs blocking inference off the event loop on a fixed pool of workers.
+
+    At most max_workers jobs run at once and at most max_queue_size more
+    requests may wait; admit() rejects everything beyond that so callers can
+    answer with 429 instead of letting latency grow without bound.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        max_workers: int,
+        max_queue_size: int,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode {mode}, expected one of {EXECUTOR_MODES}")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._initializer = initializer
+        self._pool: Optional[Executor] = None
+        self._admitted = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_size
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+
+        if self.mode == "process":
+            # Each worker process loads its own model replica in the initializer.
+            # Spawn avoids forking a parent that already started torch threads.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference",
+                initializer=self._initializer,
+            )
+        logger.info(f"Started {self.mode} executor with {self.max_workers} workers")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def acquire_slot(self) -> None:
+        # Only called from the event loop thread, so a plain counter is enough
+        if self._admitted >= self.capacity:
+            raise QueueFullError(
+                f"{self._admitted} requests in flight, capacity is {self.capacity}"
+            )
+        self._admitted += 1
+
+    def release_slot(self) -> None:
+        self._admitted -= 1
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        self.acquire_slot()
+        try:
+            yield
+        finally:
+            self.release_slot()
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        self.start()
+        # Cancelling the awaiting task also cancels the job if it has not started yet.
+        # The request id is passed along explicitly, workers do not inherit context.
+        future = self._pool.submit(
+            functools.partial(
+                call_with_request_id, REQUEST_ID.get(), time.time(), fn, *args, **kwargs
+            )
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancel():
+                self._hold_until_done(future)
+            raise
+
+    def _hold_until_done(self, future: Future) -> None:
+        # A job that already started cannot be cancelled and keeps its worker
+        # busy, so it keeps counting against the capacity until it finishes
+        loop = asyncio.get_running_loop()
+        self._admitted += 1
+
+        def release(_: Future) -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self.release_slot)
+
+        future.add_done_callback(release)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self._admitted,
+        }
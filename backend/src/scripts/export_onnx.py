@@ -0,0 +1,42 @@
+import argparse
+import logging
+import os
+import sys
+
+import coloredlogs
+from transformers import T5Tokenizer
+
+sys.path.append("..")
+from inference_backend import ONNX_INSTALL_HINT, onnx_model_path
+from predict import MODEL_PATH
+
+logger = logging.getLogger(__name__)
+coloredlogs.install(
+    level="INFO", logger=logger, fmt="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def export_onnx(load_model_path: str, output_dir: str) -> None:
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise RuntimeError(ONNX_INSTALL_HINT) from e
+
+    # Exports encoder, decoder and decoder_with_past graphs, the last one
+    # lets generation reuse the key/value cache instead of recomputing it
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        load_model_path, export=True, use_cache=True
+    )
+    model.save_pretrained(output_dir)
+    T5Tokenizer.from_pretrained(load_model_path).save_pretrained(output_dir)
+    logger.info(f"Exported ONNX model to {output_dir}: {sorted(os.listdir(output_dir))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-lm", "--load-model", type=str, default=MODEL_PATH)
+    # Defaults to <load-model>-onnx, which is where the onnx backend looks
+    parser.add_argument("-o", "--output-dir", type=str, default="")
+    args = parser.parse_args()
+
+    export_onnx(args.load_model, args.output_dir or onnx_model_path(args.load_model))
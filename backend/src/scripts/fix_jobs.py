@@ -0,0 +1,91 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from validation import candidate_key
+
+
+class FixJob:
+    def __init__(self, job_id: str, predictions: List[str], latency: Dict[str, float]):
+        self.job_id = job_id
+        self.predictions = predictions
+        self.latency = latency
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.finished_at: Optional[float] = None
+
+    def add_predictions(self, predictions: List[str]) -> None:
+        # The fast candidates keep their rank, the full beam only appends new ones
+        seen = {candidate_key(prediction) for prediction in self.predictions}
+        for prediction in predictions:
+            key = candidate_key(prediction)
+            if key not in seen:
+                seen.add(key)
+                self.predictions.append(prediction)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.status = "failed" if error else "done"
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "predictions": self.predictions,
+            "latency": {name: round(value, 3) for name, value in self.latency.items()},
+        }
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+class FixJobStore:
+    """
+    Keeps the background full-beam jobs started by fast /get-fixes requests
+    until the client has had time to poll them. Finished jobs expire after
+    ttl_s, and the oldest jobs are dropped once max_jobs is reached.
+    """
+
+    def __init__(self, max_jobs: int, ttl_s: float):
+        self._max_jobs = max_jobs
+        self._ttl_s = ttl_s
+        self._jobs: "OrderedDict[str, FixJob]" = OrderedDict()
+
+    def create(self, predictions: List[str], latency: Dict[str, float]) -> FixJob:
+        self._expire()
+        while len(self._jobs) >= self._max_jobs:
+            _, oldest = self._jobs.popitem(last=False)
+            if oldest.task is not None:
+                oldest.task.cancel()
+
+        job = FixJob(uuid.uuid4().hex, predictions, latency)
+        self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[FixJob]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def _expire(self) -> None:
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self._ttl_s
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self) -> None:
+        for job in self._jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+        self._jobs.clear()
+
+    def stats(self) -> Dict[str, int]:
+        running = sum(job.status == "running" for job in self._jobs.values())
+        return {"jobs": len(self._jobs), "running": running}
@@ -0,0 +1,99 @@
+import logging
+import os
+from typing import Callable, Dict, Final
+
+from config import LOW_CPU_MEM_USAGE
+
+logger = logging.getLogger(__name__)
+
+ONNX_INSTALL_HINT: Final[str] = (
+    "The onnx backend needs optimum with ONNX Runtime: pip install optimum[onnxruntime]"
+)
+
+
+def load_pretrained_t5(load_model_path: str):
+    from transformers import T5ForConditionalGeneration
+
+    # low_cpu_mem_usage skips the randomly initialized copy of the weights,
+    # and safetensors checkpoints are read through mmap instead of unpickled
+    use_safetensors = os.path.isfile(os.path.join(load_model_path, "model.safetensors"))
+    return T5ForConditionalGeneration.from_pretrained(
+        load_model_path,
+        low_cpu_mem_usage=LOW_CPU_MEM_USAGE,
+        use_safetensors=use_safetensors or None,
+    )
+
+
+def load_torch_model(load_model_path: str, tokenizer):
+    import torch
+
+    model = load_pretrained_t5(load_model_path)
+    logger.info(f"Loaded model from directory {load_model_path}")
+
+    # Determine the device
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+    logger.info(f"Model is loaded to {device}")
+
+    # Resize the token embeddings and set model to evaluation mode
+    model.resize_token_embeddings(len(tokenizer))
+    model.eval()
+
+    return model
+
+
+def load_quantized_torch_model(load_model_path: str, tokenizer):
+    import torch
+
+    model = load_pretrained_t5(load_model_path)
+    model.resize_token_embeddings(len(tokenizer))
+    model.eval()
+
+    # Dynamic quantization stores Linear weights as int8 and quantizes
+    # activations on the fly, it is only supported on CPU
+    model = torch.quantization.quantize_dynamic(
+        model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8
+    )
+    logger.info(f"Loaded int8 quantized model from directory {load_model_path}")
+    return model
+
+
+def onnx_model_path(load_model_path: str) -> str:
+    return load_model_path.rstrip("/\\") + "-onnx"
+
+
+def load_onnx_model(load_model_path: str, tokenizer):
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise RuntimeError(ONNX_INSTALL_HINT) from e
+
+    export_dir = onnx_model_path(load_model_path)
+    if not os.path.isdir(export_dir):
+        raise FileNotFoundError(
+            f"No ONNX export found at {export_dir}, run export_onnx.py first"
+        )
+
+    # The decoder_with_past graph reuses the key/value cache between steps
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        export_dir, use_cache=True, provider="CPUExecutionProvider"
+    )
+    logger.info(f"Loaded ONNX Runtime model from directory {export_dir}")
+    return model
+
+
+# Backend name -> loader, every loader returns an object with a transformers
+# style generate() and a device attribute
+BACKEND_LOADERS: Dict[str, Callable] = {
+    "torch": load_torch_model,
+    "torch-int8": load_quantized_torch_model,
+    "onnx": load_onnx_model,
+}
+
+
+def load_inference_model(backend: str, load_model_path: str, tokenizer):
+    if backend not in BACKEND_LOADERS:
+        raise ValueError(
+            f"Unknown inference backend {backend}, expected one of {tuple(BACKEND_LOADERS)}"
+        )
+    return BACKEND_LOADERS[backend](load_model_path, tokenizer)
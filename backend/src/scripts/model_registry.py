@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from utils import get_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+ModelKey = Tuple[str, str]
+
+
+class LoadedModel:
+    def __init__(self, model, tokenizer, load_time: float, footprint_bytes: int):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.load_time = load_time
+        self.footprint_bytes = footprint_bytes
+        self.warmup_time = None
+
+
+def get_model_footprint(model) -> int:
+    # Weights and buffers only, activations are not included
+    if not hasattr(model, "state_dict"):
+        # ONNX Runtime sessions keep their weights outside of Python
+        return 0
+
+    total = 0
+    seen = set()
+    for value in model.state_dict().values():
+        # Dynamically quantized Linear layers store (weight, bias) tuples
+        tensors = value if isinstance(value, tuple) else (value,)
+        for tensor in tensors:
+            # T5 ties the encoder, decoder and shared embeddings to one storage
+            if not hasattr(tensor, "element_size") or tensor.data_ptr() in seen:
+                continue
+            seen.add(tensor.data_ptr())
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded (model, tokenizer) pairs keyed by
+    (model_name, load_model_path), so every request shares one copy.
+    """
+
+    def __init__(self, loader: Callable[[str, str], Tuple[Any, Any]]):
+        self._loader = loader
+        self._models: Dict[ModelKey, LoadedModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, load_model_path: str) -> LoadedModel:
+        key = (model_name, load_model_path)
+        loaded = self._models.get(key)
+        if loaded is not None:
+            return loaded
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            loaded = self._models.get(key)
+            if loaded is None:
+                start_time = time.time()
+                model, tokenizer = self._loader(model_name, load_model_path)
+                load_time = time.time() - start_time
+                loaded = LoadedModel(
+                    model, tokenizer, load_time, get_model_footprint(model)
+                )
+                self._models[key] = loaded
+                logger.info(
+                    f"Registered model {load_model_path} in {load_time:.2f} seconds."
+                )
+        return loaded
+
+    def warmup(
+        self,
+        model_name: str,
+        load_model_path: str,
+        warmup_fn: Callable[[Any, Any], None],
+    ) -> LoadedModel:
+        loaded = self.get(model_name, load_model_path)
+        start_time = time.time()
+        warmup_fn(loaded.model, loaded.tokenizer)
+        loaded.warmup_time = time.time() - start_time
+        logger.info(f"Warmed up model {load_model_path} in {loaded.warmup_time:.2f} seconds.")
+        return loaded
+
+    def is_loaded(self, model_name: str, load_model_path: str) -> bool:
+        return (model_name, load_model_path) in self._models
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "model_name": model_name,
+                "load_model_path": load_model_path,
+                "device": str(loaded.model.device),
+                "load_time": round(loaded.load_time, 3),
+                "warmup_time": (
+                    None if loaded.warmup_time is None else round(loaded.warmup_time, 3)
+                ),
+                "footprint_bytes": loaded.footprint_bytes,
+            }
+            for (model_name, load_model_path), loaded in self._models.items()
+        ]
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok" if self._models else "loading",
+            "rss_bytes": get_rss_bytes(),
+            "models": self.stats(),
+        }
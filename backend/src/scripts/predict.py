@@ -1,28 +1,43 @@
-import json
+import atexit
+import functools
 import logging
 import os
-import pprint
-import re
-import subprocess
 import sys
-import tempfile
 import time
-from typing import Dict, Final, List
+from typing import TYPE_CHECKING, Dict, Final, List, Tuple
 
-import autopep8
 import coloredlogs
-import torch
-from tqdm import tqdm
-from transformers import T5ForConditionalGeneration, T5Tokenizer, set_seed
+
+# torch and transformers are imported where they are first needed, so the
+# server and the CLIs can start before paying for those imports
+if TYPE_CHECKING:
+    import torch
 
 sys.path.append("..")
+from config import (
+    INFERENCE_BACKEND,
+    VALIDATION_HEALTH_CHECK_INTERVAL_S,
+    VALIDATION_LEASE_TIMEOUT_S,
+    VALIDATION_POOL_SIZE,
+    VALIDATION_WORKSPACE_MAX_USES,
+)
+from inference_backend import load_inference_model
+from model_registry import ModelRegistry
+from telemetry import CANDIDATES, LOG_FORMAT, add_request_id_filter, stage_span
 from utils import get_current_time
+from validation import (
+    PyreCheckError,
+    PyreError,
+    dedupe_candidates,
+    format_candidate,
+    validate_candidates,
+)
+from workspace_pool import WorkspacePool
 
 # Setup logging
 logger = logging.getLogger(__name__)
-coloredlogs.install(
-    level="INFO", logger=logger, fmt="%(asctime)s - %(levelname)s - %(message)s"
-)
+coloredlogs.install(level="INFO", logger=logger, fmt=LOG_FORMAT)
+add_request_id_filter(logger)
 
 # Global Constants
 MODEL_NAME: Final[str] = "../utils/t5base_final/"
@@ -30,15 +45,60 @@ MODEL_PATH: Final[str] = "../utils/t5base_final/checkpoint-1190"
 DEFAULT_SEQ_NUM: Final[int] = 10
 DEFAULT_BEAM_SIZE: Final[int] = 10
 DEFAULT_MAX_LENGTH: Final[int] = 256
+LENGTH_BUCKETS: Final[Tuple[int, ...]] = (32, 64, 128, 256)
+TOKENIZER_CACHE_SIZE: Final[int] = 4096
+
+SAMPLE_DATA: Final[Dict[str, str]] = {
+    "rule_id": "Incompatible return type [7]",
+    "message": "Expected `Tuple[str, str]` but got `Tuple[str, int]`",
+    "warning_line": "    return (name, age)\n",
+    "source_code": "from typing import Tuple\ndef get_student_info(name: str, age: int) -> Tuple[str, str]:\n    return (name, age)",
+}
+
+# Warm Pyre servers shared by every validation in this process
+VALIDATION_POOL = (
+    WorkspacePool(
+        VALIDATION_POOL_SIZE,
+        VALIDATION_WORKSPACE_MAX_USES,
+        VALIDATION_HEALTH_CHECK_INTERVAL_S,
+        VALIDATION_LEASE_TIMEOUT_S,
+    )
+    if VALIDATION_POOL_SIZE > 0
+    else None
+)
+if VALIDATION_POOL is not None:
+    atexit.register(VALIDATION_POOL.shutdown)
+
+
+def check_predictions(
+    predictions: Dict[str, str]
+) -> Tuple[Dict[str, str], Dict[str, List[PyreError]]]:
+    # Candidates with the same AST are formatted and checked only once
+    with stage_span("normalize"):
+        unique, representatives = dedupe_candidates(predictions)
+        formatted = {pred_id: format_candidate(code) for pred_id, code in unique.items()}
+    if len(unique) < len(predictions):
+        logger.info(
+            f"Collapsed {len(predictions) - len(unique)} duplicate candidates before validation."
+        )
 
+    # All candidates are checked by one Pyre run instead of one run per candidate
+    with stage_span("validate"):
+        if VALIDATION_POOL is not None:
+            unique_errors = VALIDATION_POOL.check(formatted)
+        else:
+            unique_errors = validate_candidates(formatted)
 
-def process_prediction(code: str) -> str:
-    lines = code.split("\n")
-    processed_lines = [
-        re.sub(r"^<DED>\s{0,4}", "", line.strip().replace("<IND>", "    "))
-        for line in lines
-    ]
-    return "\n".join(processed_lines)
+    candidates = {
+        pred_id: formatted[first_id] for pred_id, first_id in representatives.items()
+    }
+    errors_by_pred_id = {
+        pred_id: unique_errors.get(first_id, [])
+        for pred_id, first_id in representatives.items()
+    }
+    for errors in errors_by_pred_id.values():
+        CANDIDATES.labels("invalid" if errors else "valid").inc()
+    return candidates, errors_by_pred_id
 
 
 def validate_predictions(predictions: Dict[str, str]) -> List[str]:
@@ -46,48 +106,69 @@ def validate_predictions(predictions: Dict[str, str]) -> List[str]:
     validation_folder = "validation_files"
     os.makedirs(validation_folder, exist_ok=True)
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        config_path = os.path.join(temp_dir, ".pyre_configuration")
-        with open(config_path, "w") as config_file:
-            config_file.write('{"source_directories": ["."]}\n')
+    candidates, errors_by_pred_id = check_predictions(predictions)
 
-        script_path = os.path.join(temp_dir, "all_predictions.py")
+    for pred_id, errors in errors_by_pred_id.items():
+        if not errors:
+            logger.info(f"Prediction {pred_id} is valid.")
+            valid_predictions.append(pred_id)
 
-        for pred_id, code in tqdm(predictions.items(), desc="Validating predictions"):
-            processed_code = (
-                code.replace("<IND>", " ").replace("<DED>", " ").lstrip("\n").rstrip()
+            # Write valid prediction to the validation folder
+            valid_file_path = os.path.join(
+                validation_folder, f"valid_prediction_{pred_id}.py"
+            )
+            with open(valid_file_path, "w") as valid_file:
+                valid_file.write(candidates[pred_id])
+        else:
+            descriptions = "\n".join(str(error["description"]) for error in errors)
+            logger.warning(
+                f"Prediction {pred_id} is invalid. Pyre output:\n{descriptions}"
             )
-            fixed_code = autopep8.fix_code(processed_code)
-
-            with open(script_path, "w") as script_file:
-                script_file.write(fixed_code)
-
-            try:
-                result = subprocess.run(
-                    ["pyre", "check"], cwd=temp_dir, capture_output=True, text=True
-                )
-                # logger.error(f"Pyre output: {pred_id} => \n{len(result.stdout)}")
-
-                if len(result.stdout) == 0:
-                    logger.info(f"Prediction {pred_id} is valid.")
-                    valid_predictions.append(pred_id)
-
-                    # Write valid prediction to the validation folder
-                    valid_file_path = os.path.join(
-                        validation_folder, f"valid_prediction_{pred_id}.py"
-                    )
-                    with open(valid_file_path, "w") as valid_file:
-                        valid_file.write(fixed_code)
-                else:
-                    logger.warning(
-                        f"Prediction {pred_id} is invalid. Pyre output:\n{result.stdout}"
-                    )
-            except subprocess.CalledProcessError:
-                pass
 
     return valid_predictions
 
 
+def filter_valid_predictions(predictions: Dict[str, str]) -> Dict[str, str]:
+    try:
+        valid_predictions = set(validate_predictions(predictions))
+    except PyreCheckError as e:
+        # Serving unvalidated candidates beats serving none when Pyre itself fails
+        logger.error(f"Validation skipped: {e}")
+        return predictions
+    return {k: v for k, v in predictions.items() if k in valid_predictions}
+
+
+@functools.lru_cache(maxsize=TOKENIZER_CACHE_SIZE)
+def encode_text(tokenizer, input_text: str, max_length: int) -> Tuple[int, ...]:
+    # Editors resend the same prompts often, so tokenized ids are cached
+    return tuple(tokenizer.encode(input_text, truncation=True, max_length=max_length))
+
+
+def bucket_length(length: int, max_length: int) -> int:
+    for bucket in LENGTH_BUCKETS:
+        if length <= bucket:
+            return min(bucket, max_length)
+    return max_length
+
+
+def pad_to_bucket(
+    tokenizer, encoded_texts: List[Tuple[int, ...]], max_length: int
+) -> Tuple["torch.Tensor", "torch.Tensor"]:
+    import torch
+
+    # Pad a batch to the smallest length bucket that fits its longest input
+    # instead of always padding to max_length
+    padded_length = bucket_length(max(len(ids) for ids in encoded_texts), max_length)
+    input_ids = torch.full(
+        (len(encoded_texts), padded_length), tokenizer.pad_token_id, dtype=torch.long
+    )
+    attention_mask = torch.zeros((len(encoded_texts), padded_length), dtype=torch.long)
+    for i, ids in enumerate(encoded_texts):
+        input_ids[i, : len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[i, : len(ids)] = 1
+    return input_ids, attention_mask
+
+
 def get_single_prediction(
     model,
     tokenizer,
@@ -96,16 +177,15 @@ def get_single_prediction(
     beam_size=DEFAULT_BEAM_SIZE,
     num_seq=DEFAULT_SEQ_NUM,
 ) -> List[str]:
+    import torch
 
-    input_ids = tokenizer.encode(
-        input_text,
-        truncation=True,
-        padding="max_length",
-        max_length=max_length,
-        return_tensors="pt",
-    ).to(model.device)
+    # A single input needs no padding, the encoder only sees its real tokens
+    with stage_span("tokenize"):
+        input_ids = torch.tensor(
+            [encode_text(tokenizer, input_text, max_length)], device=model.device
+        )
 
-    with torch.no_grad():  # Disable gradient calculation
+    with stage_span("generate"), torch.no_grad():  # Disable gradient calculation
         beam_outputs = model.generate(
             input_ids,
             max_length=max_length,
@@ -114,30 +194,114 @@ def get_single_prediction(
             early_stopping=True,  # Early stopping to potentially reduce the generation time
         )
 
-    return [
-        tokenizer.decode(output, skip_special_tokens=True) for output in beam_outputs
-    ]
+    with stage_span("decode"):
+        return [
+            tokenizer.decode(output, skip_special_tokens=True) for output in beam_outputs
+        ]
+
 
+def get_batch_predictions(
+    model,
+    tokenizer,
+    input_texts: List[str],
+    max_length=DEFAULT_MAX_LENGTH,
+    beam_size=DEFAULT_BEAM_SIZE,
+    num_seq=DEFAULT_SEQ_NUM,
+) -> List[List[str]]:
+    with stage_span("tokenize"):
+        encoded_texts = [
+            encode_text(tokenizer, input_text, max_length) for input_text in input_texts
+        ]
+    return get_batch_predictions_from_ids(
+        model, tokenizer, encoded_texts, max_length, beam_size, num_seq
+    )
+
+
+def get_batch_predictions_from_ids(
+    model,
+    tokenizer,
+    encoded_texts: List[Tuple[int, ...]],
+    max_length=DEFAULT_MAX_LENGTH,
+    beam_size=DEFAULT_BEAM_SIZE,
+    num_seq=DEFAULT_SEQ_NUM,
+) -> List[List[str]]:
+    import torch
+
+    # For callers that already hold token ids, e.g. from a compiled dataset cache
+    with stage_span("pad"):
+        input_ids, attention_mask = pad_to_bucket(tokenizer, encoded_texts, max_length)
+
+    with stage_span("generate"), torch.no_grad():
+        beam_outputs = model.generate(
+            input_ids.to(model.device),
+            attention_mask=attention_mask.to(model.device),
+            max_length=max_length,
+            num_beams=beam_size,
+            num_return_sequences=num_seq,
+            early_stopping=True,
+        )
+
+    # generate returns num_seq consecutive sequences for every input
+    with stage_span("decode"):
+        decoded = tokenizer.batch_decode(beam_outputs, skip_special_tokens=True)
+    return [decoded[i * num_seq : (i + 1) * num_seq] for i in range(len(encoded_texts))]
+
+
+def load_model_and_tokenizer(
+    model_name: str, load_model_path: str, backend: str = INFERENCE_BACKEND
+):
+    from transformers import T5Tokenizer
 
-def load_model_and_tokenizer(model_name: str, load_model_path: str):
     # Load the tokenizer
     tokenizer = T5Tokenizer.from_pretrained(load_model_path)
     logger.info(f"Loaded tokenizer from directory {load_model_path}")
 
-    # Load the model
-    model = T5ForConditionalGeneration.from_pretrained(load_model_path)
-    logger.info(f"Loaded model from directory {load_model_path}")
+    # Load the model with the configured backend (torch, torch-int8 or onnx)
+    model = load_inference_model(backend, load_model_path, tokenizer)
 
-    # Determine the device
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
-    logger.info(f"Model is loaded to {device}")
+    return model, tokenizer
 
-    # Resize the token embeddings and set model to evaluation mode
-    model.resize_token_embeddings(len(tokenizer))
-    model.eval()
 
-    return model, tokenizer
+MODEL_REGISTRY = ModelRegistry(load_model_and_tokenizer)
+
+
+def get_model_and_tokenizer(
+    model_name: str = MODEL_NAME, load_model_path: str = MODEL_PATH
+):
+    loaded = MODEL_REGISTRY.get(model_name, load_model_path)
+    return loaded.model, loaded.tokenizer
+
+
+def warmup_model(model, tokenizer) -> None:
+    # A single short generation initializes kernels and allocator pools
+    input_text = build_input_text(SAMPLE_DATA)
+    get_single_prediction(model, tokenizer, input_text, beam_size=1, num_seq=1)
+
+
+def init_worker() -> None:
+    # Process pool workers load and warm up their own model replica on start
+    MODEL_REGISTRY.warmup(MODEL_NAME, MODEL_PATH, warmup_model)
+
+
+def to_prediction_dict(predictions: List[str]) -> Dict[str, str]:
+    # Ids are beam positions, so collapsing duplicates keeps the ranking
+    with stage_span("normalize"):
+        unique, _ = dedupe_candidates(
+            {str(i): value for i, value in enumerate(predictions)}
+        )
+    CANDIDATES.labels("generated").inc(len(predictions))
+    CANDIDATES.labels("duplicate").inc(len(predictions) - len(unique))
+    return unique
+
+
+def set_seed(seed: int) -> None:
+    from transformers import set_seed as transformers_set_seed
+
+    transformers_set_seed(seed)
+
+
+def build_input_text(data: Dict[str, str]) -> str:
+    return f"fix {data['rule_id']} {data['message']} {data['warning_line']}:\n{data['source_code']}"
 
 
 def generate_predictions(
@@ -151,7 +315,82 @@ def generate_predictions(
     predictions = get_single_prediction(
         model, tokenizer, input_text, max_length, beam_size, num_seq
     )
-    return {str(i): value for i, value in enumerate(predictions)}
+    return to_prediction_dict(predictions)
+
+
+def get_final_batch_predictions(
+    datas: List[Dict[str, str]],
+    max_length: int = DEFAULT_MAX_LENGTH,
+    beam_size: int = DEFAULT_BEAM_SIZE,
+    num_seq: int = DEFAULT_SEQ_NUM,
+    model_name: str = MODEL_NAME,
+    load_model_path: str = MODEL_PATH,
+) -> List[Dict[str, str]]:
+    set_seed(42)
+
+    model, tokenizer = get_model_and_tokenizer(model_name, load_model_path)
+    input_texts = [build_input_text(data) for data in datas]
+
+    logger.info(f"Generating predictions for a batch of {len(input_texts)} inputs...")
+    start_time = time.time()
+    batch_predictions = get_batch_predictions(
+        model, tokenizer, input_texts, max_length, beam_size, num_seq
+    )
+    prediction_time = time.time() - start_time
+    logger.info(f"Batch predictions generated in {prediction_time:.2f} seconds.")
+
+    return [to_prediction_dict(predictions) for predictions in batch_predictions]
+
+
+def get_bucketed_batch_predictions(
+    datas: List[Dict[str, str]],
+    bucket_size: int,
+    max_length: int = DEFAULT_MAX_LENGTH,
+    beam_size: int = DEFAULT_BEAM_SIZE,
+    num_seq: int = DEFAULT_SEQ_NUM,
+    model_name: str = MODEL_NAME,
+    load_model_path: str = MODEL_PATH,
+) -> Tuple[Dict[int, Dict[str, str]], Dict[int, str]]:
+    # Returns predictions and errors, both keyed by the index of the input
+    set_seed(42)
+
+    model, tokenizer = get_model_and_tokenizer(model_name, load_model_path)
+    input_texts = [build_input_text(data) for data in datas]
+
+    # Group inputs of similar length so each generate call pads as little
+    # as possible, the ids are cached and reused by get_batch_predictions
+    lengths = [
+        len(encode_text(tokenizer, input_text, max_length)) for input_text in input_texts
+    ]
+    order = sorted(range(len(input_texts)), key=lambda i: lengths[i])
+    buckets = [order[i : i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+    results: Dict[int, Dict[str, str]] = {}
+    errors: Dict[int, str] = {}
+    while buckets:
+        bucket = buckets.pop(0)
+        try:
+            bucket_predictions = get_batch_predictions(
+                model,
+                tokenizer,
+                [input_texts[i] for i in bucket],
+                max_length,
+                beam_size,
+                num_seq,
+            )
+        except Exception as e:
+            logger.error(f"Batch of {len(bucket)} inputs failed: {e}")
+            if len(bucket) > 1:
+                # Retry one by one so a single bad input does not fail its whole bucket
+                buckets.extend([i] for i in bucket)
+            else:
+                errors[bucket[0]] = str(e)
+            continue
+
+        for i, predictions in zip(bucket, bucket_predictions):
+            results[i] = to_prediction_dict(predictions)
+
+    return results, errors
 
 
 def get_final_predictions(
@@ -161,6 +400,7 @@ def get_final_predictions(
     num_seq: int = DEFAULT_SEQ_NUM,
     model_name: str = MODEL_NAME,
     load_model_path: str = MODEL_PATH,
+    validate: bool = False,
 ):
     set_seed(42)
 
@@ -168,11 +408,8 @@ def get_final_predictions(
 
     logger.info(f"Start time: {get_current_time()}")
 
-    model, tokenizer = load_model_and_tokenizer(model_name, load_model_path)
+    model, tokenizer = get_model_and_tokenizer(model_name, load_model_path)
 
-    rule_id = data["rule_id"]
-    message = data["message"]
-    warning_line = data["warning_line"]
     source_code = data["source_code"]
 
     indented_code = (
@@ -182,7 +419,7 @@ def get_final_predictions(
         .rstrip()
     )
 
-    input_text = f"fix {rule_id} {message} {warning_line}:\n{source_code}"
+    input_text = build_input_text(data)
 
     logger.info("Generating predictions...")
     start_time = time.time()
@@ -194,12 +431,13 @@ def get_final_predictions(
     prediction_time = end_time - start_time
     logger.info(f"Predictions generated in {prediction_time:.2f} seconds.")
 
-    logger.info("Validating predictions...")
-    start_time = time.time()
-    # valid_predictions = validate_predictions(predictions)
-    end_time = time.time()
-    validation_time = end_time - start_time
-    logger.info(f"Predictions validated in {validation_time:.2f} seconds.")
+    if validate:
+        logger.info("Validating predictions...")
+        start_time = time.time()
+        predictions = filter_valid_predictions(predictions)
+        end_time = time.time()
+        validation_time = end_time - start_time
+        logger.info(f"Predictions validated in {validation_time:.2f} seconds.")
 
     preds = []
     logger.info("Final validated predictions:")
@@ -217,15 +455,8 @@ def get_final_predictions(
 
 
 if __name__ == "__main__":
-    sample_data = {
-        "rule_id": "Incompatible return type [7]",
-        "message": "Expected `Tuple[str, str]` but got `Tuple[str, int]`",
-        "warning_line": "    return (name, age)\n",
-        "source_code": "from typing import Tuple\ndef get_student_info(name: str, age: int) -> Tuple[str, str]:\n    return (name, age)",
-    }
-
     get_final_predictions(
-        data=sample_data,
+        data=SAMPLE_DATA,
         num_seq=DEFAULT_SEQ_NUM,
         model_name=MODEL_NAME,
         load_model_path=MODEL_PATH,
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CachedPredictions = Dict[str, str]
+
+
+def model_fingerprint(load_model_path: str) -> str:
+    # Any change to the checkpoint files (retrain, new weights) yields a new fingerprint
+    digest = hashlib.sha256()
+    if not os.path.isdir(load_model_path):
+        digest.update(load_model_path.encode())
+        return digest.hexdigest()[:16]
+
+    for root, _, files in sorted(os.walk(load_model_path)):
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            stat = os.stat(path)
+            rel_path = os.path.relpath(path, load_model_path)
+            digest.update(f"{rel_path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def normalize_input_text(input_text: str) -> str:
+    # Line endings and trailing whitespace do not change what the editor asked for
+    lines = input_text.replace("\r\n", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+class PredictionCache:
+    """
+    Two-level cache of generated predictions: an in-memory LRU in front of
+    an SQLite table. Keys hash the normalized T5 input, the generation
+    parameters and the model fingerprint, so a new checkpoint never serves
+    stale entries.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        fingerprint: str,
+        max_memory_entries: int,
+        max_disk_entries: int,
+        ttl_s: float,
+    ):
+        self.fingerprint = fingerprint
+        self._max_memory_entries = max_memory_entries
+        self._max_disk_entries = max_disk_entries
+        self._ttl_s = ttl_s
+        self._memory: "OrderedDict[str, Tuple[float, float, CachedPredictions]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        # Opened on first use in each process: server.py forks workers after
+        # importing the app, and an SQLite connection must not cross a fork
+        self._db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid = 0
+        # Connections inherited from a parent are kept referenced, never
+        # closed, closing them could release the parent's locks
+        self._inherited: List[sqlite3.Connection] = []
+
+    def _connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+        if self._conn is not None:
+            self._inherited.append(self._conn)
+
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS predictions (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                compute_time REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS predictions_last_access ON predictions (last_access)"
+        )
+        # Entries produced by any other checkpoint can never be hit again
+        deleted = conn.execute(
+            "DELETE FROM predictions WHERE fingerprint != ?", (self.fingerprint,)
+        ).rowcount
+        conn.commit()
+        if deleted:
+            logger.info(f"Invalidated {deleted} cached predictions from older checkpoints")
+
+        self._conn, self._conn_pid = conn, os.getpid()
+        return conn
+
+    def make_key(
+        self, input_text: str, num_seq: int, beam_size: int, max_length: int
+    ) -> str:
+        payload = json.dumps(
+            [self.fingerprint, normalize_input_text(input_text), num_seq, beam_size, max_length]
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedPredictions]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, compute_time, value = entry
+                if now - created_at <= self._ttl_s:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self.saved_seconds += compute_time
+                    return value
+                del self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, compute_time, created_at FROM predictions WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or now - row[2] > self._ttl_s:
+                self.misses += 1
+                return None
+
+            value, compute_time, created_at = json.loads(row[0]), row[1], row[2]
+            conn.execute(
+                "UPDATE predictions SET last_access = ? WHERE key = ?", (now, key)
+            )
+            conn.commit()
+            self._remember(key, created_at, compute_time, value)
+            self.disk_hits += 1
+            self.saved_seconds += compute_time
+            return value
+
+    def put(self, key: str, value: CachedPredictions, compute_time: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, compute_time, value)
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.fingerprint, json.dumps(value), compute_time, now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _remember(
+        self, key: str, created_at: float, compute_time: float, value: CachedPredictions
+    ) -> None:
+        self._memory[key] = (created_at, compute_time, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            "DELETE FROM predictions WHERE created_at < ?", (now - self._ttl_s,)
+        )
+        conn.execute(
+            """
+            DELETE FROM predictions WHERE key IN (
+                SELECT key FROM predictions ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self._max_disk_entries,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk_entries = self._connection().execute(
+                "SELECT COUNT(*) FROM predictions"
+            ).fetchone()[0]
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "fingerprint": self.fingerprint,
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            ),
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
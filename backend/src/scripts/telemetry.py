@@ -0,0 +1,113 @@
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Final, Iterator, List, Optional, Tuple
+
+import coloredlogs
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LOG_FORMAT: Final[str] = "%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+LATENCY_BUCKETS: Final[Tuple[float, ...]] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+# Spans of the inference job running in the current context, see call_with_request_id
+SPANS: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("spans", default=None)
+
+REQUESTS = Counter(
+    "pytyfix_requests_total", "HTTP requests by route and status code", ["route", "status"]
+)
+REQUEST_SECONDS = Histogram(
+    "pytyfix_request_seconds", "HTTP request latency", ["route"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "pytyfix_stage_seconds",
+    "Time spent in each prediction stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+CANDIDATES = Counter(
+    "pytyfix_candidates_total",
+    "Fix candidates by outcome (generated, duplicate, valid, invalid)",
+    ["outcome"],
+)
+CACHE_LOOKUPS = Counter(
+    "pytyfix_cache_lookups_total", "Prediction cache lookups by result", ["result"]
+)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        return True
+
+
+def add_request_id_filter(logger: logging.Logger) -> None:
+    # Handlers format with %(request_id)s, so every record they see needs it
+    for handler in logger.handlers:
+        handler.addFilter(RequestIdFilter())
+
+
+logger = logging.getLogger(__name__)
+coloredlogs.install(level="INFO", logger=logger, fmt=LOG_FORMAT)
+add_request_id_filter(logger)
+
+
+@contextmanager
+def stage_span(stage: str) -> Iterator[None]:
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        spans = SPANS.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def call_with_request_id(
+    request_id: str, submitted_at: float, fn: Callable[..., Any], *args, **kwargs
+) -> Any:
+    # Runs on an executor worker, thread or process, where the caller's
+    # context variables are not visible
+    queue_wait = time.time() - submitted_at
+    STAGE_SECONDS.labels("queue_wait").observe(queue_wait)
+    request_token = REQUEST_ID.set(request_id)
+    spans_token = SPANS.set([("queue_wait", queue_wait)])
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        spans = SPANS.get()
+        logger.info(
+            "Stages: " + ", ".join(f"{stage}={1000 * elapsed:.1f}ms" for stage, elapsed in spans)
+        )
+        SPANS.reset(spans_token)
+        REQUEST_ID.reset(request_token)
+
+
+def metrics_response() -> Tuple[bytes, str]:
+    # Process executor workers write their samples to PROMETHEUS_MULTIPROC_DIR
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,6 +1,6 @@
 from datetime import datetime
-import json
 import os
+import sys
 from typing import Dict, List
 
 from data_reader import DataPoint
@@ -18,6 +18,60 @@ def get_current_time() -> str:
     return current_time
 
 
+def get_rss_bytes() -> int:
+    # Current resident set size, falls back to the peak RSS where /proc is missing
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return get_peak_rss_bytes()
+
+
+def get_peak_rss_bytes() -> int:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_memory_breakdown() -> Dict[str, int]:
+    # Forked workers share the parent's pages until they write to them, PSS
+    # splits those shared pages between the processes that map them
+    fields = {"Rss": "rss_bytes", "Pss": "pss_bytes"}
+    breakdown = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                parts = value.split()
+                if not parts or not parts[0].isdigit():
+                    continue
+                size = int(parts[0]) * 1024
+                if name in fields:
+                    breakdown[fields[name]] = size
+                elif name.startswith("Shared_"):
+                    breakdown["shared_bytes"] = breakdown.get("shared_bytes", 0) + size
+                elif name.startswith("Private_"):
+                    breakdown["private_bytes"] = breakdown.get("private_bytes", 0) + size
+    except OSError:
+        return {"rss_bytes": get_rss_bytes()}
+    return breakdown
+
+
+def normalize_code(code: str) -> str:
+    # The T5 tokenizer does not keep newlines or indentation, so predictions
+    # are compared to targets with all whitespace runs collapsed
+    return " ".join(code.split())
+
+
+def is_exact_match(prediction: str, target: str) -> bool:
+    return normalize_code(prediction) == normalize_code(target)
+
+
 def compute_dict_average(dict: Dict) -> float:
     # empty dictionary, return 0
     if not dict:
@@ -44,12 +98,12 @@ def get_project_names(directory):
     """
     Reads all files in a directory and returns a set of file names.
     """
+    # Projects come from the corpus manifest, only changed files are re-read
+    from corpus_index import build_manifest
+
     file_names = {}
-    for file_name in os.listdir(directory):
-        if file_name.endswith(".json"):
-            # normalized_project_name = file_name.replace("dd_out_", "").rsplit("_",1)[0]
-            with open(directory+'/'+file_name, 'r') as f:
-                data = json.load(f)
-                project_name = str(data[0]['project'])
-                file_names[project_name.replace('/','-')] = project_name
+    for entry in build_manifest(directory).values():
+        project_name = entry.get("project")
+        if project_name is not None:
+            file_names[project_name.replace('/','-')] = project_name
     return file_names
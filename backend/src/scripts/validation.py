@@ -0,0 +1,167 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import textwrap
+from typing import Dict, Final, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+PYRE_CONFIGURATION: Final[str] = '{"source_directories": ["."]}\n'
+PYRE_CHECK_COMMAND: Final[List[str]] = ["pyre", "--noninteractive", "--output=json", "check"]
+PYRE_INCREMENTAL_COMMAND: Final[List[str]] = [
+    "pyre",
+    "--noninteractive",
+    "--output=json",
+    "incremental",
+]
+CANDIDATE_PREFIX: Final[str] = "candidate_"
+INDENTATION_PREFIX: Final[re.Pattern] = re.compile(r"([ \t]*)((?:<IND>|<DED>)*)")
+
+PyreError = Dict[str, object]
+
+
+class PyreCheckError(RuntimeError):
+    pass
+
+
+def decode_indentation(code: str) -> str:
+    # Markers at the start of a line stand for its indentation, one <IND> per
+    # level. After real indentation they only repeat it and are dropped.
+    lines = []
+    for line in code.split("\n"):
+        match = INDENTATION_PREFIX.match(line)
+        indent, markers = match.groups()
+        if not indent:
+            indent = "    " * markers.count("<IND>")
+        rest = line[match.end():].replace("<IND>", "").replace("<DED>", "")
+        lines.append(indent + rest if rest.strip() else "")
+    return textwrap.dedent("\n".join(lines)).strip("\n")
+
+
+def candidate_key(code: str) -> str:
+    # Candidates that only differ in whitespace, indentation markers or
+    # formatting have the same AST and need to be validated only once
+    source = decode_indentation(code)
+    try:
+        canonical = ast.dump(ast.parse(source))
+    except (SyntaxError, ValueError):
+        # Keep the indentation, it is what tells blocks apart
+        canonical = "\n".join(
+            line[: len(line) - len(line.lstrip())] + " ".join(line.split())
+            for line in source.split("\n")
+            if line.strip()
+        )
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def dedupe_candidates(
+    candidates: Dict[str, str]
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    # Returns the distinct candidates in their original (beam) order and
+    # prediction id -> id of the first candidate with the same key
+    unique = {}
+    representatives = {}
+    first_by_key: Dict[str, str] = {}
+    for pred_id, code in candidates.items():
+        key = candidate_key(code)
+        if key not in first_by_key:
+            first_by_key[key] = pred_id
+            unique[pred_id] = code
+        representatives[pred_id] = first_by_key[key]
+    return unique, representatives
+
+
+def format_candidate(code: str) -> str:
+    processed_code = (
+        code.replace("<IND>", " ").replace("<DED>", " ").lstrip("\n").rstrip()
+    )
+    import autopep8
+
+    return autopep8.fix_code(processed_code)
+
+
+def write_pyre_configuration(project_dir: str) -> None:
+    with open(os.path.join(project_dir, ".pyre_configuration"), "w") as config_file:
+        config_file.write(PYRE_CONFIGURATION)
+
+
+def candidate_file_name(index: int) -> str:
+    return f"{CANDIDATE_PREFIX}{index}.py"
+
+
+def write_candidates(project_dir: str, candidates: Dict[str, str]) -> Dict[str, str]:
+    # Each candidate becomes its own module so one Pyre run checks all of them.
+    # Returns file name -> prediction id.
+    file_to_pred_id = {}
+    for index, (pred_id, code) in enumerate(candidates.items()):
+        file_name = candidate_file_name(index)
+        with open(os.path.join(project_dir, file_name), "w") as candidate_file:
+            candidate_file.write(code)
+        file_to_pred_id[file_name] = pred_id
+    return file_to_pred_id
+
+
+def remove_candidates(project_dir: str) -> None:
+    for file_name in os.listdir(project_dir):
+        if file_name.startswith(CANDIDATE_PREFIX) and file_name.endswith(".py"):
+            os.remove(os.path.join(project_dir, file_name))
+
+
+def run_pyre(project_dir: str, command: Sequence[str]) -> List[PyreError]:
+    try:
+        result = subprocess.run(
+            list(command), cwd=project_dir, capture_output=True, text=True
+        )
+    except FileNotFoundError as e:
+        raise PyreCheckError(f"Pyre is not installed: {e}") from e
+    # Pyre exits with 1 when it found type errors, anything else is a failed run
+    if result.returncode not in (0, 1):
+        raise PyreCheckError(
+            f"{' '.join(command)} exited with {result.returncode}: {result.stderr.strip()}"
+        )
+
+    output = result.stdout.strip()
+    if not output:
+        return []
+    try:
+        return json.loads(output)
+    except json.JSONDecodeError as e:
+        raise PyreCheckError(f"Could not parse Pyre output: {e}") from e
+
+
+def group_errors_by_candidate(
+    errors: List[PyreError], file_to_pred_id: Dict[str, str]
+) -> Dict[str, List[PyreError]]:
+    errors_by_pred_id: Dict[str, List[PyreError]] = {
+        pred_id: [] for pred_id in file_to_pred_id.values()
+    }
+    for error in errors:
+        pred_id = file_to_pred_id.get(os.path.basename(str(error.get("path", ""))))
+        if pred_id is not None:
+            errors_by_pred_id[pred_id].append(error)
+    return errors_by_pred_id
+
+
+def check_candidates(
+    project_dir: str, candidates: Dict[str, str], incremental: bool = False
+) -> Dict[str, List[PyreError]]:
+    remove_candidates(project_dir)
+    file_to_pred_id = write_candidates(project_dir, candidates)
+    command = PYRE_INCREMENTAL_COMMAND if incremental else PYRE_CHECK_COMMAND
+    errors = run_pyre(project_dir, command)
+    return group_errors_by_candidate(errors, file_to_pred_id)
+
+
+def validate_candidates(candidates: Dict[str, str]) -> Dict[str, List[PyreError]]:
+    """
+    Type checks every formatted candidate with a single Pyre run and returns
+    the errors reported for each prediction id (an empty list means valid).
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        write_pyre_configuration(temp_dir)
+        return check_candidates(temp_dir, candidates)
@@ -0,0 +1,213 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Final, Iterator, List, Optional
+
+from validation import (
+    PyreCheckError,
+    PyreError,
+    check_candidates,
+    remove_candidates,
+    run_pyre,
+    validate_candidates,
+    write_pyre_configuration,
+)
+
+logger = logging.getLogger(__name__)
+
+PYRE_START_COMMAND: Final[List[str]] = ["pyre", "--noninteractive", "start"]
+PYRE_STOP_COMMAND: Final[List[str]] = ["pyre", "--noninteractive", "stop"]
+PYRE_HEALTH_COMMAND: Final[List[str]] = [
+    "pyre",
+    "--noninteractive",
+    "--output=json",
+    "incremental",
+    "--no-start",
+]
+# The server learns about swapped candidate files only through watchman
+WATCHMAN_CONFIGURATION: Final[str] = "{}\n"
+
+
+def watchman_available() -> bool:
+    return shutil.which("watchman") is not None
+
+
+class ValidationWorkspace:
+    """
+    A temporary Pyre project with its own long-lived Pyre server. Candidate
+    files are swapped in for every check so the server only re-analyzes
+    what changed instead of loading typeshed from scratch. The project is
+    a watchman root, watchman is how the server sees the swapped files.
+    """
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix="pytyfix_workspace_")
+        self.uses = 0
+        self.last_checked = 0.0
+        write_pyre_configuration(self.path)
+        with open(os.path.join(self.path, ".watchmanconfig"), "w") as config_file:
+            config_file.write(WATCHMAN_CONFIGURATION)
+
+    def start(self) -> None:
+        result = subprocess.run(
+            PYRE_START_COMMAND, cwd=self.path, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            self.close()
+            raise PyreCheckError(f"Could not start Pyre server: {result.stderr.strip()}")
+        self.last_checked = time.time()
+        logger.info(f"Started Pyre server for workspace {self.path}")
+
+    def check(self, candidates: Dict[str, str]) -> Dict[str, List[PyreError]]:
+        self.uses += 1
+        errors_by_pred_id = check_candidates(self.path, candidates, incremental=True)
+        self.last_checked = time.time()
+        return errors_by_pred_id
+
+    def is_healthy(self) -> bool:
+        # An incremental check of an empty project is cheap on a live server
+        # and fails with --no-start when the server died
+        remove_candidates(self.path)
+        try:
+            run_pyre(self.path, PYRE_HEALTH_COMMAND)
+        except PyreCheckError as e:
+            logger.warning(f"Workspace {self.path} is unhealthy: {e}")
+            return False
+        self.last_checked = time.time()
+        return True
+
+    def close(self) -> None:
+        subprocess.run(PYRE_STOP_COMMAND, cwd=self.path, capture_output=True, text=True)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class WorkspacePool:
+    """
+    Bounded pool of warm validation workspaces. Workspaces are created on
+    demand up to max_size, health checked when they have been idle for
+    health_check_interval_s and recycled after max_uses checks. Without
+    watchman, a server would keep reporting errors of earlier candidates,
+    so every check runs a fresh `pyre check` instead.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        max_uses: int,
+        health_check_interval_s: float,
+        lease_timeout_s: float,
+    ):
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.health_check_interval_s = health_check_interval_s
+        self.lease_timeout_s = lease_timeout_s
+        self._idle: Deque[ValidationWorkspace] = deque()
+        self._size = 0
+        self._available = threading.Condition()
+        self.created = 0
+        self.recycled = 0
+        self.incremental = watchman_available()
+        if not self.incremental:
+            logger.warning(
+                "watchman is not installed, validation falls back to a fresh pyre check per request"
+            )
+
+    @contextmanager
+    def lease(self) -> Iterator[ValidationWorkspace]:
+        workspace = self._acquire()
+        try:
+            yield workspace
+        except PyreCheckError:
+            # A failed Pyre run may have left the server in a bad state
+            self._discard(workspace)
+            raise
+        except BaseException:
+            self._release(workspace)
+            raise
+        else:
+            self._release(workspace)
+
+    def check(self, candidates: Dict[str, str]) -> Dict[str, List[PyreError]]:
+        if not self.incremental:
+            return validate_candidates(candidates)
+        with self.lease() as workspace:
+            return workspace.check(candidates)
+
+    def _acquire(self) -> ValidationWorkspace:
+        while True:
+            workspace = self._take_idle_or_reserve()
+            if workspace is None:
+                return self._create()
+            if time.time() - workspace.last_checked < self.health_check_interval_s:
+                return workspace
+            if workspace.is_healthy():
+                return workspace
+            self._discard(workspace)
+
+    def _take_idle_or_reserve(self) -> Optional[ValidationWorkspace]:
+        # Returns an idle workspace, or None after reserving a slot for a new one
+        deadline = time.time() + self.lease_timeout_s
+        with self._available:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PyreCheckError(
+                        f"No validation workspace became free within {self.lease_timeout_s} seconds"
+                    )
+                self._available.wait(remaining)
+
+            if self._idle:
+                return self._idle.popleft()
+            self._size += 1
+            return None
+
+    def _create(self) -> ValidationWorkspace:
+        try:
+            workspace = ValidationWorkspace()
+            workspace.start()
+        except BaseException:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+        self.created += 1
+        return workspace
+
+    def _release(self, workspace: ValidationWorkspace) -> None:
+        if workspace.uses >= self.max_uses:
+            self.recycled += 1
+            self._discard(workspace)
+            return
+
+        with self._available:
+            self._idle.append(workspace)
+            self._available.notify()
+
+    def _discard(self, workspace: ValidationWorkspace) -> None:
+        workspace.close()
+        with self._available:
+            self._size -= 1
+            self._available.notify()
+
+    def shutdown(self) -> None:
+        with self._available:
+            idle = list(self._idle)
+            self._idle.clear()
+        for workspace in idle:
+            self._discard(workspace)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "incremental": self.incremental,
+            "max_size": self.max_size,
+            "size": self._size,
+            "idle": len(self._idle),
+            "created": self.created,
+            "recycled": self.recycled,
+        }
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from batching import BatchScheduler
+from executor import InferenceExecutor
+
+
+def test_timed_out_batches_are_dropped_and_the_queue_drains():
+    started = threading.Event()
+    release = threading.Event()
+    batches = []
+
+    def run_batch(datas, num_seq, beam_size):
+        batches.append(datas)
+        started.set()
+        release.wait(5)
+        return [{"0": data["id"]} for data in datas]
+
+    async def scenario():
+        executor = InferenceExecutor("thread", 1, 10)
+        scheduler = BatchScheduler(run_batch, 1, 8, executor)
+
+        async def request(i):
+            with executor.admit():
+                return await asyncio.wait_for(
+                    scheduler.submit({"id": str(i)}, 10, 10), 0.2
+                )
+
+        # The first batch occupies the only worker, the second one waits in
+        # the pool queue, both callers give up
+        first = asyncio.ensure_future(request(0))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with pytest.raises(asyncio.TimeoutError):
+            await request(1)
+        with pytest.raises(asyncio.TimeoutError):
+            await first
+
+        # The running job still holds its slot, the queued one was dropped
+        assert executor.stats()["in_flight"] == 1
+        release.set()
+        for _ in range(100):
+            if executor.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.stats()["in_flight"] == 0
+        assert not scheduler._tasks
+
+        # The worker is free again for the next request
+        assert await request(2) == {"0": "2"}
+        executor.shutdown()
+
+    asyncio.run(scenario())
+    assert batches == [[{"id": "0"}], [{"id": "2"}]]
@@ -0,0 +1,21 @@
+import json
+
+from corpus_index import index_file
+
+
+def test_non_object_samples_are_a_file_error(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps([{"project": "a/b", "rule_id": "E1"}, ["not", "a", "sample"]]))
+
+    entry = index_file(str(path))
+
+    assert entry == {"error": "sample 1 is not a JSON object"}
+
+
+def test_samples_are_counted_by_rule_id(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"project": "a/b", "rule_id": "E1"}\n{"linter_report": {"rule_id": "E1"}}\n')
+
+    entry = index_file(str(path))
+
+    assert entry == {"project": "a/b", "samples": 2, "rule_ids": {"E1": 2}}
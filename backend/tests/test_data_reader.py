@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from data_reader import GetDataAsPython, GetDataAsTable, TextColumn, ToInt
+
+SAMPLE = {
+    "source_code": "def f(x):\n    return é + x",
+    "target_code": "def f(x: int):\n    return x",
+    "warning_line": "    return x",
+    "linter_report": {
+        "rule_id": "Incompatible return type [7]",
+        "message": "Expected `str` but got `int`.",
+        "evidence": None,
+        "col_begin": "4",
+        "col_end": 12,
+        "line_begin": None,
+        "line_end": "",
+        "severity": "error",
+    },
+    "instructions": [
+        {
+            "type": "replace",
+            "text": "int",
+            "line_number": 1,
+            "line_column": 9,
+            "global_idx": 0,
+            "description": "Replace \ud83d",
+            "relativ_pos": 0,
+        }
+    ],
+    "source_file": "a.py",
+    "target_file": "a.py",
+    "repo": "org/repo",
+    "source_filename": "a.py",
+    "target_filename": "a.py",
+    "source_changeid": "1",
+    "target_changeid": "2",
+}
+
+
+def test_text_column_round_trips_values():
+    column = TextColumn()
+    for value in ["", "abc", None, "é\ud83d", "x"]:
+        column.Append(value)
+    assert [column[i] for i in range(len(column))] == ["", "abc", None, "é\ud83d", "x"]
+
+
+def test_table_rows_match_data_points(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps([SAMPLE, dict(SAMPLE, repo="org/other")]))
+
+    table = GetDataAsTable(str(path))
+    data_points = GetDataAsPython(str(path))
+
+    assert len(table) == 2
+    for row, data_point in zip(table, data_points):
+        assert row.GetDescription() == data_point.GetDescription()
+        assert row.GetT5Representation(True) == data_point.GetT5Representation(True)
+        assert row.linter_report.evidence is None
+        assert row.linter_report.line_begin == -1
+    assert table[-1].repo == "org/other"
+
+
+def test_non_integer_fields_raise():
+    with pytest.raises(ValueError, match="line_begin"):
+        ToInt("1.5", "line_begin")
@@ -0,0 +1,29 @@
+import json
+import sys
+from array import array
+
+from dataset_cache import ARRAY_FILES, TokenizedDataset
+
+
+def write_dataset(path, inputs, targets):
+    for name, rows in (("input", inputs), ("target", targets)):
+        offsets = [0]
+        with open(path / f"{name}_ids.bin", "wb") as f:
+            for ids in rows:
+                array(ARRAY_FILES[f"{name}_ids"], ids).tofile(f)
+                offsets.append(offsets[-1] + len(ids))
+        with open(path / f"{name}_offsets.bin", "wb") as f:
+            array(ARRAY_FILES[f"{name}_offsets"], offsets).tofile(f)
+    meta = {"byteorder": sys.byteorder, "samples": len(inputs), "typecodes": ARRAY_FILES}
+    (path / "meta.json").write_text(json.dumps(meta))
+
+
+def test_close_while_slices_are_referenced(tmp_path):
+    write_dataset(tmp_path, [[1, 2], [3, 4, 5]], [[6], [7, 8]])
+    dataset = TokenizedDataset(str(tmp_path))
+    input_ids, target_ids = dataset[1]
+
+    dataset.close()
+
+    assert list(input_ids) == [3, 4, 5]
+    assert list(target_ids) == [7, 8]
@@ -0,0 +1,38 @@
+from validation import candidate_key, dedupe_candidates
+
+
+def test_indentation_markers_and_spaces_have_the_same_key():
+    assert candidate_key("def f(x):\n<IND>return x") == candidate_key(
+        "def f(x):\n    return x"
+    )
+    # The tokenizer writes the marker after the indentation it stands for
+    assert candidate_key("def f(x):\n    <IND>return x\n<DED>y = 1") == candidate_key(
+        "def f(x):\n    return x\ny = 1"
+    )
+    assert candidate_key("    <IND>return x") == candidate_key("return x")
+
+
+def test_statements_in_different_blocks_have_different_keys():
+    inside = "def f(x, y):\n    if x:\n        return y\n    return x"
+    outside = "def f(x, y):\n    if x:\n        pass\n    return y\n    return x"
+    assert candidate_key(inside) != candidate_key(outside)
+    assert candidate_key(
+        "if x:\n<IND><IND>return y\n<IND>return x"
+    ) != candidate_key("if x:\n<IND>return y\n<IND>return x")
+
+
+def test_unparsable_candidates_keep_their_indentation():
+    assert candidate_key("if x:\n    return y\nelse") != candidate_key(
+        "if x:\nreturn y\nelse"
+    )
+    assert candidate_key("if x:\n    return  y\nelse") == candidate_key(
+        "if x:\n    return y\nelse"
+    )
+
+
+def test_dedupe_keeps_the_first_of_equal_candidates():
+    unique, representatives = dedupe_candidates(
+        {"0": "x = 1", "1": "x=1", "2": "x = 2"}
+    )
+    assert unique == {"0": "x = 1", "2": "x = 2"}
+    assert representatives == {"0": "0", "1": "0", "2": "2"}
@@ -0,0 +1,48 @@
+import os
+import shutil
+
+import pytest
+
+import workspace_pool
+from workspace_pool import ValidationWorkspace, WorkspacePool
+
+GOOD_CANDIDATE = "def f(x: int) -> int:\n    return x\n"
+BAD_CANDIDATE = 'def f(x: int) -> int:\n    return "x"\n'
+
+
+def test_workspace_is_a_watchman_root():
+    workspace = ValidationWorkspace()
+    try:
+        assert os.path.isfile(os.path.join(workspace.path, ".watchmanconfig"))
+    finally:
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+
+def test_pool_falls_back_to_pyre_check_without_watchman(monkeypatch):
+    monkeypatch.setattr(workspace_pool, "watchman_available", lambda: False)
+    checked = []
+    monkeypatch.setattr(
+        workspace_pool,
+        "validate_candidates",
+        lambda candidates: checked.append(candidates) or {"0": []},
+    )
+    pool = WorkspacePool(1, 10, 60, 1)
+
+    assert pool.check({"0": GOOD_CANDIDATE}) == {"0": []}
+    assert checked == [{"0": GOOD_CANDIDATE}]
+    assert pool.stats()["created"] == 0
+
+
+@pytest.mark.skipif(
+    shutil.which("pyre") is None or shutil.which("watchman") is None,
+    reason="needs pyre and watchman",
+)
+def test_bad_candidate_after_good_one_gets_errors():
+    pool = WorkspacePool(1, 10, 60, 30)
+    try:
+        assert pool.check({"0": GOOD_CANDIDATE}) == {"0": []}
+        errors = pool.check({"0": BAD_CANDIDATE})
+        assert errors["0"]
+        assert pool.stats()["created"] == 1
+    finally:
+        pool.shutdown()
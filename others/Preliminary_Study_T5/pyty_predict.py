@@ -47,32 +47,40 @@ def validate_predictions(predictions: Dict[str, str]) -> List[str]:
         with open(os.path.join(temp_dir, ".pyre_configuration"), "w") as config_file:
             config_file.write('{"source_directories": ["."]}\n')
 
-        # Create a single file for all predictions
-        temp_file_path = os.path.join(temp_dir, "prediction.py")
-
-        for pred_id, code in predictions.items():
+        # Write every prediction as its own module so a single Pyre run checks them all
+        file_to_pred_id = {}
+        for index, (pred_id, code) in enumerate(predictions.items()):
             processed_code = process_code(code)
             print(f"CODE for {pred_id}: {processed_code}")
 
-            # Write the processed code to the file, overwriting its contents
-            with open(temp_file_path, "w") as temp_file:
+            file_name = f"prediction_{index}.py"
+            with open(os.path.join(temp_dir, file_name), "w") as temp_file:
                 temp_file.write(processed_code)
-
-            try:
-                # Run Pyre check in the temporary directory
-                result = subprocess.run(
-                    ["pyre", "check"], cwd=temp_dir, capture_output=True, text=True
-                )
-
-                print("ISSUE #", pred_id, ">", result.stderr)
-                print("\n")
-
-                # If Pyre doesn't report any errors, consider the prediction valid
-                if result.returncode == 0:
-                    valid_predictions.append(pred_id)
-
-            except subprocess.CalledProcessError as e:
-                print(f"Error for prediction {pred_id}: {e}")
+            file_to_pred_id[file_name] = pred_id
+
+        # Run Pyre check once in the temporary directory
+        result = subprocess.run(
+            ["pyre", "--noninteractive", "--output=json", "check"],
+            cwd=temp_dir,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode not in (0, 1):
+            print(f"Pyre failed: {result.stderr}")
+            return valid_predictions
+
+        # Map the reported errors back to the prediction they belong to
+        invalid_pred_ids = set()
+        for error in json.loads(result.stdout or "[]"):
+            pred_id = file_to_pred_id.get(os.path.basename(error["path"]))
+            if pred_id is not None:
+                print("ISSUE #", pred_id, ">", error["description"])
+                invalid_pred_ids.add(pred_id)
+
+        # If Pyre doesn't report any errors, consider the prediction valid
+        valid_predictions = [
+            pred_id for pred_id in predictions if pred_id not in invalid_pred_ids
+        ]
 
     return valid_predictions
 
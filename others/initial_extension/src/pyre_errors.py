@@ -0,0 +1,157 @@
+import io
+import json
+import re
+import sys
+from typing import IO, Iterator, List, NamedTuple, Union
+
+READ_CHUNK_SIZE = 1 << 16
+
+# path:line:column Name [code]: message
+# Only a drive letter (C:\...) may put a colon in the path, colons in the
+# message are kept in the message. No group backtracks, so one pass over a
+# whole `pyre check` output stays linear
+TEXT_ERROR = re.compile(
+    r'^(?P<path>(?:[A-Za-z]:)?[^:\n]+):(?P<line>\d+):(?P<column>\d+) '
+    r'(?P<name>[^\[\n]+) \[(?P<code>-?\d+)\]: ?(?P<message>[^\r\n]*)',
+    re.MULTILINE,
+)
+
+
+class PyreError(NamedTuple):
+    path: str
+    line: int
+    column: int
+    code: int
+    name: str
+    message: str
+
+    @property
+    def rule_id(self) -> str:
+        return f'{self.name} [{self.code}]'
+
+
+def error_from_json(error: dict) -> PyreError:
+    # description is "Name [code]: message", the message is what follows
+    description = error.get('description', '')
+    _, separator, message = description.partition(']: ')
+    if not separator:
+        message = description
+    return PyreError(
+        error['path'],
+        int(error['line']),
+        int(error['column']),
+        int(error['code']),
+        error['name'],
+        message.strip(),
+    )
+
+
+def iter_json_errors(stream: IO[str], chunk_size: int = READ_CHUNK_SIZE) -> Iterator[PyreError]:
+    # Decodes the array of `pyre --output=json check` one error at a time,
+    # only the current error and one read chunk are kept in memory
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()
+    if not buffer:
+        return
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array of Pyre errors')
+
+    pos = 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError('Need more data', buffer, pos)
+            error, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = stream.read(max(chunk_size, len(buffer) - pos))
+            if not chunk:
+                raise ValueError('Unexpected end of Pyre JSON output')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield error_from_json(error)
+
+
+def error_from_match(match: re.Match) -> PyreError:
+    path, line, column, name, code, message = match.groups()
+    return PyreError(path, int(line), int(column), int(code), name, message)
+
+
+def iter_text_errors(stream: IO[str]) -> Iterator[PyreError]:
+    # Lines that are not errors (progress output, warnings) are skipped
+    for line in stream:
+        match = TEXT_ERROR.match(line.rstrip('\n'))
+        if match:
+            yield error_from_match(match)
+
+
+def parse_text_errors(output: str) -> List[PyreError]:
+    # One regex pass over the whole output, no per-line splitting
+    return [
+        PyreError(path, int(line), int(column), int(code), name, message)
+        for path, line, column, name, code, message in TEXT_ERROR.findall(output)
+    ]
+
+
+def parse_json_errors(output: str) -> List[PyreError]:
+    return [error_from_json(error) for error in json.loads(output)]
+
+
+def parse_pyre_errors(output: str) -> List[PyreError]:
+    """
+    Parses the output of `pyre check`, either `--output=json` or text,
+    into PyreError records.
+    """
+    if output.lstrip().startswith('['):
+        return parse_json_errors(output)
+    return parse_text_errors(output)
+
+
+def iter_pyre_errors(stream: Union[IO[str], str]) -> Iterator[PyreError]:
+    # Same as parse_pyre_errors, for a stream such as the stdout of a
+    # running `pyre --output=json check`
+    if isinstance(stream, str):
+        stream = io.StringIO(stream)
+    first = ''
+    while True:
+        char = stream.read(1)
+        if not char or not char.isspace():
+            first = char
+            break
+    rest = _Prepended(first, stream)
+    if first == '[':
+        yield from iter_json_errors(rest)
+    else:
+        yield from iter_text_errors(rest)
+
+
+class _Prepended:
+    # A stream with the character consumed while sniffing the format put back
+    def __init__(self, head: str, stream: IO[str]):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size: int = -1) -> str:
+        head, self.head = self.head, ''
+        if size < 0:
+            return head + self.stream.read()
+        return head + self.stream.read(max(0, size - len(head)))
+
+    def __iter__(self) -> Iterator[str]:
+        head, self.head = self.head, ''
+        first_line = head + self.stream.readline() if head else ''
+        if first_line:
+            yield first_line
+        yield from self.stream
+
+
+if __name__ == '__main__':
+    # pyre --output=json check | python pyre_errors.py
+    for error in iter_pyre_errors(sys.stdin):
+        print(json.dumps(error._asdict()))
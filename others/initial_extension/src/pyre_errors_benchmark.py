@@ -0,0 +1,101 @@
+"""
+Compares the split-based parse_pyre_output with pyre_errors on synthetic
+Pyre output: text parsed line by line, text parsed in one regex pass, and
+--output=json parsed in bulk and as a stream.
+
+    python pyre_errors_benchmark.py [--errors 50000] [--repeats 5]
+"""
+
+import argparse
+import io
+import json
+import time
+
+from pyre_errors import iter_pyre_errors, parse_json_errors, parse_text_errors
+
+MESSAGES = [
+    ('Incompatible return type', 7, 'Expected `Tuple[str, str]` but got `Tuple[str, int]`.'),
+    ('Undefined attribute', 16, 'Module `os` has no attribute `foo`.'),
+    ('Incompatible parameter type', 6, 'In call `f`, for 1st positional argument, expected `Dict[str, int]` but got `str`.'),
+    ('Missing return annotation', 3, 'Returning `None` but no return type is specified.'),
+]
+PATHS = ['src/app/main.py', 'C:\\Users\\dev\\project\\models.py', 'tests/test_utils.py']
+
+
+def split_parse(output):
+    # The original parse_pyre_output, kept here as the baseline
+    parts = output.split(':')
+    file_name = parts[0]
+    line_number = parts[1]
+    col_number = parts[2].split(' ')[0]
+    err_type = ' '.join(parts[2].split(' ')[1:])
+    err_msg = ':'.join(parts[3:]).strip()
+    return file_name, line_number, col_number, err_type, err_msg
+
+
+def make_errors(count):
+    errors = []
+    for i in range(count):
+        name, code, message = MESSAGES[i % len(MESSAGES)]
+        errors.append({
+            'line': i % 500 + 1,
+            'column': i % 40,
+            'stop_line': i % 500 + 1,
+            'stop_column': i % 40 + 5,
+            'path': PATHS[i % len(PATHS)],
+            'code': code,
+            'name': name,
+            'description': f'{name} [{code}]: {message}',
+            'concise_description': f'{name} [{code}]: {message}',
+        })
+    return errors
+
+
+def to_text(errors):
+    return ''.join(
+        f"{e['path']}:{e['line']}:{e['column']} {e['description']}\n" for e in errors
+    )
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--errors', type=int, default=50000)
+    parser.add_argument('-r', '--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    errors = make_errors(args.errors)
+    text_output = to_text(errors)
+    json_output = json.dumps(errors)
+
+    split_time, split_results = best_of(
+        lambda: [split_parse(line) for line in text_output.splitlines()], args.repeats
+    )
+    split_wrong = sum(
+        result[0] != error['path'] or int(result[1]) != error['line']
+        for result, error in zip(split_results, errors)
+    )
+
+    runs = {
+        'split (per line)': split_time,
+        'regex (one pass)': best_of(lambda: parse_text_errors(text_output), args.repeats)[0],
+        'json (bulk)': best_of(lambda: parse_json_errors(json_output), args.repeats)[0],
+        'json (stream)': best_of(
+            lambda: list(iter_pyre_errors(io.StringIO(json_output))), args.repeats
+        )[0],
+    }
+
+    assert parse_text_errors(text_output) == parse_json_errors(json_output)
+
+    print(f'{args.errors} errors, best of {args.repeats}')
+    for name, elapsed in runs.items():
+        print(f'  {name:<18} {1000 * elapsed:8.2f} ms  {args.errors / elapsed:12,.0f} errors/s')
+    print(f'  split parser misread the path of {split_wrong} errors (Windows paths)')
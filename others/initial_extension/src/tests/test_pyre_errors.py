@@ -0,0 +1,77 @@
+import io
+import json
+
+from pyre_errors import (
+    PyreError,
+    iter_json_errors,
+    iter_pyre_errors,
+    parse_json_errors,
+    parse_pyre_errors,
+    parse_text_errors,
+)
+
+ERRORS = [
+    PyreError('src/app/main.py', 3, 4, 7, 'Incompatible return type',
+              'Expected `Tuple[str, str]` but got `Tuple[str, int]`.'),
+    PyreError('C:\\Users\\dev\\project\\models.py', 12, 0, 16, 'Undefined attribute',
+              'Module `os` has no attribute `foo`.'),
+    PyreError('tests/test_utils.py', 40, 8, 6, 'Incompatible parameter type',
+              'In call `f`, for 1st positional argument, expected `Dict[str, int]`: got `str`.'),
+    PyreError('src/app/main.py', 5, 0, -1, 'Revealed type', 'Revealed type for `x` is `int`.'),
+]
+
+
+def to_json(errors):
+    return json.dumps([
+        {
+            'path': e.path,
+            'line': e.line,
+            'column': e.column,
+            'code': e.code,
+            'name': e.name,
+            'description': f'{e.name} [{e.code}]: {e.message}',
+        }
+        for e in errors
+    ])
+
+
+def to_text(errors):
+    return ''.join(
+        f'{e.path}:{e.line}:{e.column} {e.name} [{e.code}]: {e.message}\n' for e in errors
+    )
+
+
+def test_windows_drive_letter_paths():
+    errors = parse_text_errors('C:\\work\\a.py:1:2 Undefined attribute [16]: Bad.\n')
+    assert errors == [PyreError('C:\\work\\a.py', 1, 2, 16, 'Undefined attribute', 'Bad.')]
+
+
+def test_colons_in_messages_are_kept():
+    errors = parse_text_errors('a.py:1:2 Undefined import [21]: Could not find `a:b`: x.\n')
+    assert errors[0].path == 'a.py'
+    assert errors[0].message == 'Could not find `a:b`: x.'
+
+
+def test_text_and_json_output_give_the_same_errors():
+    assert parse_pyre_errors(to_text(ERRORS)) == ERRORS
+    assert parse_pyre_errors(to_json(ERRORS)) == ERRORS
+
+
+def test_non_error_lines_are_skipped():
+    output = 'Checking 3 files\n' + to_text(ERRORS[:1]) + 'ƛ Found 1 type error!\n'
+    assert parse_text_errors(output) == ERRORS[:1]
+    assert list(iter_pyre_errors(output)) == ERRORS[:1]
+
+
+def test_streaming_matches_bulk_parsing():
+    text_output = to_text(ERRORS * 50)
+    json_output = '\n  ' + to_json(ERRORS * 50)
+    assert list(iter_pyre_errors(io.StringIO(text_output))) == parse_text_errors(text_output)
+    assert list(iter_pyre_errors(io.StringIO(json_output))) == parse_json_errors(json_output)
+    # Errors split across read chunks
+    assert list(iter_json_errors(io.StringIO(json_output), chunk_size=7)) == ERRORS * 50
+
+
+def test_empty_output():
+    assert list(iter_pyre_errors('')) == []
+    assert list(iter_pyre_errors('[]')) == []
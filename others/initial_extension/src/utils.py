@@ -1,7 +1,14 @@
+from pyre_errors import TEXT_ERROR
 
 
 def parse_pyre_output(output):
-    
+
+    match = TEXT_ERROR.match(output.strip())
+    if match:
+        file_name, line_number, col_number, name, code, err_msg = match.groups()
+        return file_name, line_number, col_number, f'{name} [{code}]', err_msg.strip()
+
+    # Not a coded Pyre error, split the way it always was
     parts = output.split(':')
     
     file_name = parts[0]
@@ -0,0 +1,192 @@
+"""
+Incremental extraction across Pyre re-checks. Each update compares the new
+error set with the previous one, keyed on (file, line, rule_id, message),
+with line numbers of edited files mapped through a line diff. Errors that
+only moved, or did not change at all, reuse their previous payload, the
+rest are extracted.
+"""
+
+import bisect
+import difflib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from error_extractor import (
+    ParsedFile,
+    extract_from_parsed,
+    group_by_file,
+    invalid_record_error,
+)
+
+ErrorKey = Tuple[str, int, str, str]
+
+
+class ErrorEntry(NamedTuple):
+    payload: Dict[str, str]
+    # Lines of the function the payload was extracted from, None outside functions
+    scope: Optional[Tuple[int, int]]
+
+
+class LineMap:
+    """
+    Maps lines of the new version of a file back to the old one, through
+    the blocks a line diff found equal. Both directions of a lookup are a
+    bisect over the blocks.
+    """
+
+    def __init__(self, old_lines: List[str], new_lines: List[str]):
+        if old_lines is new_lines or old_lines == new_lines:
+            self.blocks = [(0, len(old_lines), 0, len(new_lines))]
+        else:
+            matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+            self.blocks = [
+                (i1, i2, j1, j2)
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+                if tag == "equal"
+            ]
+        self._old_starts = [block[0] for block in self.blocks]
+        self._new_starts = [block[2] for block in self.blocks]
+
+    def _block_of_old(self, line: int) -> Optional[Tuple[int, int, int, int]]:
+        i = bisect.bisect_right(self._old_starts, line - 1) - 1
+        if i >= 0 and line - 1 < self.blocks[i][1]:
+            return self.blocks[i]
+        return None
+
+    def to_old(self, line: int) -> Optional[int]:
+        i = bisect.bisect_right(self._new_starts, line - 1) - 1
+        if i >= 0 and line - 1 < self.blocks[i][3]:
+            i1, _, j1, _ = self.blocks[i]
+            return line - j1 + i1
+        return None
+
+    def unchanged(self, start: int, end: int) -> bool:
+        # True when old lines start..end were carried over as one block
+        block = self._block_of_old(start)
+        return block is not None and end - 1 < block[1]
+
+
+class IncrementalExtractor:
+    def __init__(self, parse: Callable[[str], ParsedFile]):
+        self.parse = parse
+        self._lines: Dict[str, List[str]] = {}
+        self._errors: Dict[ErrorKey, ErrorEntry] = {}
+
+    def update(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Takes the full error set of a Pyre run, records as in --batch, and
+        returns one result per record with a status of "unchanged", "moved",
+        "changed" (re-extracted, its function was edited) or "new", plus the
+        previous errors that are gone ("resolved").
+        """
+        results: List[Dict[str, Any]] = []
+        errors: Dict[ErrorKey, ErrorEntry] = {}
+        lines: Dict[str, List[str]] = {}
+        counts = {"unchanged": 0, "moved": 0, "changed": 0, "new": 0, "failed": 0}
+        matched = set()
+
+        for file_path, group in group_by_file(records).items():
+            if file_path is None:
+                for index, record in group:
+                    results.append({"index": index, "error": invalid_record_error(record)})
+                    counts["failed"] += 1
+                continue
+            try:
+                parsed = self.parse(file_path)
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                for index, record in group:
+                    results.append(self._failure(index, file_path, record, e))
+                    counts["failed"] += 1
+                continue
+            lines[file_path] = parsed.lines
+            old_lines = self._lines.get(file_path)
+            line_map = LineMap(old_lines, parsed.lines) if old_lines is not None else None
+
+            for index, record in group:
+                try:
+                    line = int(record["line"])
+                    rule_id = str(record.get("err_type", "")).strip()
+                    message = str(record.get("err_message", "")).strip()
+                    key = (file_path, line, rule_id, message)
+
+                    status, entry = "new", None
+                    old_line = line_map.to_old(line) if line_map is not None else None
+                    if old_line is not None:
+                        old_key = (file_path, old_line, rule_id, message)
+                        if old_key in self._errors:
+                            matched.add(old_key)
+                            entry = self._reusable(old_key, line_map, parsed, line)
+                            if entry is None:
+                                # Same error, but its function was edited
+                                status = "changed"
+                            else:
+                                status = "unchanged" if old_line == line else "moved"
+                    if entry is None:
+                        payload = extract_from_parsed(
+                            parsed, rule_id, message, line, int(record.get("col", 0))
+                        )
+                        function = parsed.function_at(line)
+                        entry = ErrorEntry(
+                            payload, (function.start, function.end) if function else None
+                        )
+                except (KeyError, IndexError, TypeError, ValueError) as e:
+                    results.append(self._failure(index, file_path, record, e))
+                    counts["failed"] += 1
+                    continue
+
+                errors[key] = entry
+                counts[status] += 1
+                results.append(
+                    {
+                        "index": index,
+                        "file_path": file_path,
+                        "line": line,
+                        "col": record.get("col"),
+                        "status": status,
+                        **entry.payload,
+                    }
+                )
+
+        resolved = [
+            {"file_path": key[0], "line": key[1], "rule_id": key[2], "message": key[3]}
+            for key in self._errors
+            if key not in matched
+        ]
+        self._errors = errors
+        self._lines = lines
+        results.sort(key=lambda result: result["index"])
+        return {"results": results, "resolved": resolved, "stats": counts}
+
+    def _reusable(
+        self, old_key: ErrorKey, line_map: LineMap, parsed: ParsedFile, line: int
+    ) -> Optional[ErrorEntry]:
+        entry = self._errors[old_key]
+        if entry.scope is None:
+            # The warning line is unchanged, but code around it may have been
+            # wrapped into a new function
+            return entry if parsed.function_at(line) is None else None
+        if not line_map.unchanged(*entry.scope):
+            return None
+        # The old lines moved together, but the function may have grown
+        # around them (a new decorator, lines appended to its body)
+        new_start = line - (old_key[1] - entry.scope[0])
+        new_scope = (new_start, new_start + entry.scope[1] - entry.scope[0])
+        function = parsed.function_at(line)
+        if function is None or (function.start, function.end) != new_scope:
+            return None
+        return entry._replace(scope=new_scope)
+
+    @staticmethod
+    def _failure(
+        index: int, file_path: str, record: Dict[str, Any], e: Exception
+    ) -> Dict[str, Any]:
+        return {
+            "index": index,
+            "file_path": file_path,
+            "line": record.get("line"),
+            "col": record.get("col"),
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+    def reset(self) -> None:
+        self._lines.clear()
+        self._errors.clear()
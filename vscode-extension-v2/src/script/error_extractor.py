@@ -1,9 +1,12 @@
 import ast
+import bisect
 import json
 import os
+import re
 import sys
 import io
 import tokenize
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 
 def str_to_token_list(s, line_idx, line_count):
@@ -53,6 +56,217 @@ def count_lines(code: str) -> int:
     return len(code.strip().split("\n"))
 
 
+class Scope(NamedTuple):
+    kind: str  # "def" or "class"
+    name: str
+    start: int  # first line, decorators included
+    end: int
+    parent: Optional["Scope"]
+
+
+def collect_scopes(tree: ast.AST, parent: Optional[Scope] = None) -> List[Scope]:
+    # Returns the scopes in source order, each followed by its nested scopes
+    scopes = []
+    for node in ast.iter_child_nodes(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            scope = Scope(
+                "class" if isinstance(node, ast.ClassDef) else "def",
+                node.name,
+                start,
+                node.end_lineno,
+                parent,
+            )
+            scopes.append(scope)
+            scopes.extend(collect_scopes(node, scope))
+        else:
+            # Defs nested in if/try/with blocks belong to the same parent
+            scopes.extend(collect_scopes(node, parent))
+    return scopes
+
+
+SCOPE_HEADER = re.compile(r"(?:async\s+)?(def|class)\s+(\w+)")
+NON_CODE_TOKENS = (tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT)
+
+
+def continuation_lines(lines: List[str]) -> Set[int]:
+    # Lines that do not start a logical line: the inside of multi-line
+    # strings and the lines after the first of a bracketed expression.
+    # When tokenizing fails, say on an unclosed bracket that would swallow
+    # the rest of the file, it restarts after the line that broke it.
+    continued: Set[int] = set()
+    offset = 0
+    while offset < len(lines):
+        pending: Set[int] = set()
+        logical_start = None
+        try:
+            for token in tokenize.generate_tokens(iter(lines[offset:]).__next__):
+                first, last = token.start[0] + offset, token.end[0] + offset
+                if token.type == tokenize.NEWLINE:
+                    continued |= pending
+                    pending.clear()
+                    logical_start = None
+                    continue
+                if token.type in NON_CODE_TOKENS:
+                    continue
+                if logical_start is None:
+                    logical_start = first
+                elif first > logical_start:
+                    pending.add(first)
+                pending.update(range(first + 1, last + 1))
+            break
+        except IndentationError as e:
+            # A dedent to an unknown level, the line itself starts a statement
+            offset = max(offset + (e.lineno or 1) - 1, offset + 1)
+        except (tokenize.TokenError, SyntaxError):
+            offset = logical_start if logical_start is not None else len(lines)
+    return continued
+
+
+def collect_scopes_by_indent(lines: List[str]) -> List[Scope]:
+    # Fallback for files that do not parse: a def/class, with the decorators
+    # right above it, runs until the next logical line indented at most as
+    # far as its header
+    scopes: List[Scope] = []
+    open_scopes: List[Tuple[int, int]] = []  # (indent, index in scopes)
+    continued = continuation_lines(lines)
+    decorators: Optional[Tuple[int, int]] = None  # (first line, indent)
+    last_code_line = 0
+    for i, line in enumerate(lines, start=1):
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if i in continued:
+            last_code_line = i
+            continue
+        indent = len(line) - len(stripped)
+        while open_scopes and indent <= open_scopes[-1][0]:
+            _, index = open_scopes.pop()
+            scopes[index] = scopes[index]._replace(end=last_code_line)
+        match = SCOPE_HEADER.match(stripped)
+        if match:
+            start = decorators[0] if decorators and decorators[1] == indent else i
+            parent = scopes[open_scopes[-1][1]] if open_scopes else None
+            scopes.append(Scope(match.group(1), match.group(2), start, len(lines), parent))
+            open_scopes.append((indent, len(scopes) - 1))
+        if stripped.startswith("@"):
+            if decorators is None or decorators[1] != indent:
+                decorators = (i, indent)
+        else:
+            decorators = None
+        last_code_line = i
+    for _, index in open_scopes:
+        scopes[index] = scopes[index]._replace(end=last_code_line)
+    return scopes
+
+
+class ParsedFile:
+    """
+    A source file parsed once: its lines, top-level imports and an interval
+    index from line number to the innermost enclosing def/class.
+
+    Scopes nest, so the index stores the file as sorted, non-overlapping
+    segments, each owned by the innermost scope covering it. A lookup is
+    one bisect.
+    """
+
+    def __init__(self, source: str):
+        # Split on "\n" only, the way ast counts lines
+        self.lines = io.StringIO(source).readlines()
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            tree = None
+
+        if tree is not None:
+            scopes = collect_scopes(tree)
+            self.imports_code = "\n".join(
+                ast.unparse(node)
+                for node in tree.body
+                if isinstance(node, (ast.Import, ast.ImportFrom))
+            )
+        else:
+            scopes = collect_scopes_by_indent(self.lines)
+            self.imports_code = ""
+
+        self.scopes = scopes
+        self._segment_starts: List[int] = [1]
+        self._segment_scopes: List[Optional[Scope]] = [None]
+        self._build_index(scopes)
+
+    def _build_index(self, scopes: List[Scope]) -> None:
+        # Scopes arrive in source order with parents before children, so a
+        # stack of open scopes tells who owns the lines after a scope ends
+        stack: List[Scope] = []
+
+        def close_until(line: int) -> None:
+            while stack and stack[-1].end < line:
+                scope = stack.pop()
+                self._add_segment(scope.end + 1, stack[-1] if stack else None)
+
+        for scope in scopes:
+            close_until(scope.start)
+            self._add_segment(scope.start, scope)
+            stack.append(scope)
+        close_until(len(self.lines) + 2)
+
+    def _add_segment(self, start: int, scope: Optional[Scope]) -> None:
+        if self._segment_starts[-1] == start:
+            self._segment_scopes[-1] = scope
+        else:
+            self._segment_starts.append(start)
+            self._segment_scopes.append(scope)
+
+    def scope_at(self, line_num: int) -> Optional[Scope]:
+        i = bisect.bisect_right(self._segment_starts, line_num) - 1
+        return self._segment_scopes[i]
+
+    def function_at(self, line_num: int) -> Optional[Scope]:
+        scope = self.scope_at(line_num)
+        while scope is not None and scope.kind != "def":
+            scope = scope.parent
+        return scope
+
+    def scope_source(self, scope: Scope) -> str:
+        # Dedented by the header's indentation, so methods and nested
+        # functions parse on their own. Lines indented less, such as the
+        # inside of a string, are left as they are.
+        lines = self.lines[scope.start - 1 : scope.end]
+        header = lines[0]
+        indent = header[: len(header) - len(header.lstrip())]
+        return "".join(
+            line[len(indent) :] if line.startswith(indent) else line for line in lines
+        ).rstrip("\n")
+
+
+def parse_file(file_path: str) -> ParsedFile:
+    with open(file_path, "r") as file:
+        return ParsedFile(file.read())
+
+
+def extract_from_parsed(
+    parsed: ParsedFile, err_type: str, err_message: str, line_num: int, col_num: int
+) -> Dict[str, str]:
+    # Extract the warning line, negative indexes would wrap to the end
+    if line_num < 1:
+        raise IndexError(f"line {line_num} is out of range")
+    warning_line = parsed.lines[line_num - 1]
+
+    # The innermost function around the error, its signature included
+    function = parsed.function_at(line_num)
+    if function is not None:
+        source_code = parsed.scope_source(function)
+    else:
+        source_code = "No function definition found"
+
+    return {
+        "rule_id": err_type.strip(),
+        "message": err_message.strip(),
+        "warning_line": warning_line.strip(),
+        "source_code": source_code,
+    }
+
+
 def extract_error_info(
     file_path: str,
     err_type: str,
@@ -61,86 +275,111 @@ def extract_error_info(
     col_num: int,
     output_dir: str,
 ) -> str:
-    with open(file_path, "r") as file:
-        source_lines = file.readlines()
-
-    # Extract the warning line
-    warning_line = source_lines[line_num - 1]
-
-    # Extract the full function or class definition
-    start_line = line_num - 1
-    while start_line > 0 and not source_lines[start_line].strip().startswith(
-        ("def ", "class ")
-    ):
-        start_line -= 1
-
-    # Include the entire method if the error is in the signature
-    end_line = line_num
-    if start_line < line_num - 1:  # Error is in the method body
-        indent = len(source_lines[start_line]) - len(source_lines[start_line].lstrip())
-        while end_line < len(source_lines) and (
-            source_lines[end_line].strip() == ""
-            or len(source_lines[end_line]) - len(source_lines[end_line].lstrip())
-            > indent
-        ):
-            end_line += 1
-
-    relevant_lines = "".join(source_lines[start_line:end_line])
-
-    # Extract the function definition
-    start_line = line_num - 1
-    while start_line >= 0 and not source_lines[start_line].startswith("def "):
-        start_line -= 1
-
-    if start_line >= 0:
-        # Extract the function signature
-        signature_line = source_lines[start_line]
-
-        # If the signature is split across multiple lines, include them
-        end_line = start_line
-        while not signature_line.endswith(":"):
-            end_line += 1
-            if end_line < len(source_lines):
-                signature_line += " " + source_lines[end_line].strip()
-            else:
-                break
-
-        source_code = signature_line
-    else:
-        source_code = "No function definition found"
+    error_info = extract_from_parsed(
+        parse_file(file_path), err_type, err_message, line_num, col_num
+    )
+    return json.dumps(error_info, indent=2)
 
-    # Parse the entire file to collect import statements
-    try:
-        full_tree = ast.parse("".join(source_lines))
 
-        imports = []
-        for node in full_tree.body:
-            if isinstance(node, (ast.Import, ast.ImportFrom)):
-                imports.append(ast.unparse(node))
-        imports_code = "\n".join(imports)
+def group_by_file(records: Iterable[Any]) -> Dict[Optional[str], List[Tuple[int, Any]]]:
+    # File order follows the first error reported in each file. Records that
+    # are not objects with a string file_path are grouped under None, see
+    # invalid_record_error
+    groups: Dict[Optional[str], List[Tuple[int, Any]]] = {}
+    for index, record in enumerate(records):
+        if isinstance(record, dict) and isinstance(record.get("file_path"), str):
+            file_path = record["file_path"]
+        else:
+            file_path = None
+        groups.setdefault(file_path, []).append((index, record))
+    return groups
 
-    except SyntaxError:
-        # If parsing fails, no imports will be added
-        imports_code = ""
 
-    # Combine imports with source code
-    combined_code = f"{source_code}"
+def invalid_record_error(record: Any) -> str:
+    if isinstance(record, Exception):
+        # A line read_json_lines could not decode
+        return f"{type(record).__name__}: {record}"
+    if not isinstance(record, dict):
+        return "record is not a JSON object"
+    return "file_path must be a string"
 
-    # Construct the JSON object
-    error_info = {
-        "rule_id": err_type.strip(),
-        "message": err_message.strip(),
-        "warning_line": warning_line.strip(),
-        "source_code": combined_code,
-    }
 
-    return json.dumps(error_info, indent=2)
+def extract_batch(
+    records: Iterable[Dict], parse: Callable[[str], ParsedFile] = parse_file
+) -> Iterator[Dict]:
+    """
+    Yields one result per record, file by file, each file read and parsed
+    once. Results carry the record's index in the input and its file_path,
+    line and col, plus either the extracted fields or an "error".
+    """
+    for file_path, group in group_by_file(records).items():
+        if file_path is None:
+            for index, record in group:
+                yield {"index": index, "error": invalid_record_error(record)}
+            continue
+
+        parsed, file_error = None, ""
+        try:
+            parsed = parse(file_path)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            file_error = f"{type(e).__name__}: {e}"
+
+        for index, record in group:
+            result = {
+                "index": index,
+                "file_path": file_path,
+                "line": record.get("line"),
+                "col": record.get("col"),
+            }
+            if parsed is None:
+                result["error"] = file_error
+                yield result
+                continue
+            try:
+                result.update(
+                    extract_from_parsed(
+                        parsed,
+                        str(record.get("err_type", "")),
+                        str(record.get("err_message", "")),
+                        int(record["line"]),
+                        int(record.get("col", 0)),
+                    )
+                )
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            yield result
+
+
+def read_json_lines(stream: IO[str]) -> Iterator[Any]:
+    # A line that does not decode is yielded as its ValueError, so it gets
+    # an error result instead of ending the batch
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+def run_batch(input_stream: IO[str], output_stream: IO[str]) -> None:
+    # Records are grouped by file, so all of the input is read before the
+    # first result. Results are then flushed one at a time
+    for result in extract_batch(read_json_lines(input_stream)):
+        output_stream.write(json.dumps(result) + "\n")
+        output_stream.flush()
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["--batch"]:
+        # One JSON record per line on stdin:
+        # {"file_path", "err_type", "err_message", "line", "col"}
+        run_batch(sys.stdin, sys.stdout)
+        sys.exit(0)
+
     if len(sys.argv) != 7:
         print(
-            "Usage: python error_extractor.py <file_path> <err_type> <err_message> <line_num> <column_num> <output-dir-path>"
+            "Usage: python error_extractor.py <file_path> <err_type> <err_message> <line_num> <column_num> <output-dir-path>\n"
+            "       python error_extractor.py --batch < errors.jsonl"
         )
         sys.exit(1)
 
@@ -0,0 +1,267 @@
+"""
+Long-running error extractor. Serves JSON-RPC 2.0 requests, one JSON object
+per line, on stdin/stdout or on a local Unix socket, and keeps parsed files
+in an LRU cache keyed by path, mtime and size.
+
+Methods:
+    extract         {file_path, err_type, err_message, line, col} -> extracted fields
+    extract_batch   {errors: [...]} -> one result per error, as in --batch
+    extract_incremental
+                    {errors: [...]}, the full error set of a Pyre run -> results with
+                    a status of unchanged, moved, changed or new, and the resolved errors
+    invalidate      {file_path} or {} for every file
+    stats           cache hits, misses, evictions, entries and bytes
+    shutdown
+
+Usage:
+    python extractor_daemon.py [--socket /tmp/pytypewizard.sock] [--max-files 256] [--max-bytes 67108864]
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from typing import IO, Any, Callable, Dict, NamedTuple, Optional
+
+from error_diff import IncrementalExtractor
+from error_extractor import ParsedFile, extract_batch, extract_from_parsed, parse_file
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class CacheEntry(NamedTuple):
+    mtime_ns: int
+    size: int
+    parsed: ParsedFile
+
+
+class ParseCache:
+    """
+    LRU cache of ParsedFile objects. An entry is used only while the file's
+    mtime and size match the ones it was parsed with. Entries are evicted
+    once more than max_files are cached or their sources add up to more
+    than max_bytes.
+    """
+
+    def __init__(self, max_files: int, max_bytes: int):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, file_path: str) -> ParsedFile:
+        path = os.path.abspath(file_path)
+        # Stat before reading, a write that lands in between is picked up
+        # by the next lookup
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return entry.parsed
+                self.stale += 1
+                self._remove(path)
+            self.misses += 1
+
+        parsed = parse_file(path)
+        with self._lock:
+            if path in self._entries:
+                self._remove(path)
+            self._entries[path] = CacheEntry(stat.st_mtime_ns, stat.st_size, parsed)
+            self._bytes += stat.st_size
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_files or self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return parsed
+
+    def _remove(self, path: str) -> None:
+        entry = self._entries.pop(path)
+        self._bytes -= entry.size
+
+    def invalidate(self, file_path: Optional[str] = None) -> int:
+        with self._lock:
+            if file_path is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            path = os.path.abspath(file_path)
+            if path not in self._entries:
+                return 0
+            self._remove(path)
+            return 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_files": self.max_files,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class ExtractorService:
+    def __init__(self, cache: ParseCache):
+        self.cache = cache
+        self.running = True
+        self.incremental = IncrementalExtractor(cache.get)
+        self._incremental_lock = threading.Lock()
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "extract": self.extract,
+            "extract_batch": self.extract_batch,
+            "extract_incremental": self.extract_incremental,
+            "invalidate": self.invalidate,
+            "stats": lambda params: self.cache.stats(),
+            "shutdown": self.shutdown,
+        }
+
+    def extract(self, params: Dict[str, Any]) -> Dict[str, str]:
+        try:
+            parsed = self.cache.get(params["file_path"])
+            return extract_from_parsed(
+                parsed,
+                str(params.get("err_type", "")),
+                str(params.get("err_message", "")),
+                int(params["line"]),
+                int(params.get("col", 0)),
+            )
+        except (KeyError, IndexError, TypeError, ValueError, OSError) as e:
+            raise RpcError(INVALID_PARAMS, f"{type(e).__name__}: {e}")
+
+    def extract_batch(self, params: Dict[str, Any]) -> list:
+        errors = params.get("errors")
+        if not isinstance(errors, list):
+            raise RpcError(INVALID_PARAMS, "errors must be a list")
+        return list(extract_batch(errors, self.cache.get))
+
+    def extract_incremental(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        errors = params.get("errors")
+        if not isinstance(errors, list):
+            raise RpcError(INVALID_PARAMS, "errors must be a list")
+        with self._incremental_lock:
+            return self.incremental.update(errors)
+
+    def invalidate(self, params: Dict[str, Any]) -> Dict[str, int]:
+        if not isinstance(params.get("file_path"), (str, type(None))):
+            raise RpcError(INVALID_PARAMS, "file_path must be a string")
+        return {"removed": self.cache.invalidate(params.get("file_path"))}
+
+    def shutdown(self, params: Dict[str, Any]) -> None:
+        self.running = False
+
+    def handle_line(self, line: str) -> Optional[Dict[str, Any]]:
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RpcError(PARSE_ERROR, str(e))
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise RpcError(INVALID_REQUEST, "expected an object with a method")
+            request_id = request.get("id")
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"unknown method {request['method']}")
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params must be an object")
+            try:
+                result = method(params)
+            except RpcError:
+                raise
+            except Exception as e:
+                # A bug in one request must not take the daemon down
+                raise RpcError(INTERNAL_ERROR, f"{type(e).__name__}: {e}")
+        except RpcError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {"code": e.code, "message": str(e)},
+            }
+        if "id" not in request:
+            # Notifications get no response
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def serve(self, input_stream: IO[str], output_stream: IO[str]) -> None:
+        for line in input_stream:
+            if not line.strip():
+                continue
+            response = self.handle_line(line)
+            if response is not None:
+                output_stream.write(json.dumps(response) + "\n")
+                output_stream.flush()
+            if not self.running:
+                break
+
+
+def serve_socket(service: ExtractorService, socket_path: str) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = (line.decode("utf-8") for line in self.rfile)
+            writer = _SocketWriter(self.wfile)
+            service.serve(reader, writer)
+            if not service.running:
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+class _SocketWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text: str) -> None:
+        self.wfile.write(text.encode("utf-8"))
+
+    def flush(self) -> None:
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default="")
+    parser.add_argument("--max-files", type=int, default=256)
+    parser.add_argument("--max-bytes", type=int, default=64 * 1024 * 1024)
+    args = parser.parse_args()
+
+    service = ExtractorService(ParseCache(args.max_files, args.max_bytes))
+    if args.socket:
+        serve_socket(service, args.socket)
+    else:
+        service.serve(sys.stdin, sys.stdout)
@@ -0,0 +1,66 @@
+import os
+
+from error_diff import IncrementalExtractor
+from error_extractor import parse_file
+
+SOURCE = """import os
+
+
+def f(x):
+    y = x + 1
+    return y
+
+
+def g(q):
+    q = q * 2
+    return q
+"""
+
+
+def write(path, source):
+    with open(path, "w") as f:
+        f.write(source)
+    # Distinct mtimes, in case a caching parser sits behind the extractor
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def first_result(extractor, path, line):
+    record = {"file_path": path, "err_type": "E [1]", "err_message": "m", "line": line}
+    return extractor.update([record])["results"][0]
+
+
+def test_unedited_function_is_reused(tmp_path):
+    path = str(tmp_path / "a.py")
+    write(path, SOURCE)
+    extractor = IncrementalExtractor(parse_file)
+    assert first_result(extractor, path, 11)["status"] == "new"
+
+    write(path, "import sys\n" + SOURCE)
+    result = first_result(extractor, path, 12)
+    assert result["status"] == "moved"
+    assert result["source_code"] == "def g(q):\n    q = q * 2\n    return q"
+
+
+def test_line_appended_to_function_is_re_extracted(tmp_path):
+    path = str(tmp_path / "a.py")
+    write(path, SOURCE)
+    extractor = IncrementalExtractor(parse_file)
+    first_result(extractor, path, 11)
+
+    write(path, SOURCE + "    print(q)\n")
+    result = first_result(extractor, path, 11)
+    assert result["status"] == "changed"
+    assert result["source_code"].endswith("    print(q)")
+
+
+def test_decorator_added_to_function_is_re_extracted(tmp_path):
+    path = str(tmp_path / "a.py")
+    write(path, SOURCE)
+    extractor = IncrementalExtractor(parse_file)
+    first_result(extractor, path, 6)
+
+    write(path, SOURCE.replace("def f(x):", "@dec\ndef f(x):"))
+    result = first_result(extractor, path, 7)
+    assert result["status"] == "changed"
+    assert result["source_code"].startswith("@dec\ndef f(x):")
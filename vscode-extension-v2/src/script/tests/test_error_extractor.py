@@ -0,0 +1,114 @@
+import io
+import json
+
+import pytest
+
+from error_extractor import ParsedFile, collect_scopes_by_indent, extract_from_parsed, run_batch
+
+SOURCE = """def f(x):
+    y = x + 1
+    return y
+"""
+
+NESTED = """import os
+
+
+@decorator
+def top():
+    return 1
+
+
+class C:
+    x = 1
+
+    def method(self):
+        def inner():
+            return 2
+
+        return inner()
+
+    y = 2
+"""
+
+BROKEN = """@decorator(
+    name="x",
+)
+def f(x):
+    \"\"\"Doc
+
+column zero
+    \"\"\"
+    return x +
+
+
+class C:
+    @property
+    def g(self):
+        return (
+    1)
+"""
+
+
+def test_line_before_start_of_file_is_out_of_range():
+    with pytest.raises(IndexError):
+        extract_from_parsed(ParsedFile(SOURCE), "E [1]", "m", 0, 0)
+
+
+def test_bad_lines_do_not_stop_the_batch(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text(SOURCE)
+    lines = [
+        "not json",
+        "[1]",
+        json.dumps({"file_path": 1, "line": 1}),
+        json.dumps({"file_path": str(path), "line": 0}),
+        json.dumps({"file_path": str(path), "err_type": "E [1]", "line": 3}),
+    ]
+    output = io.StringIO()
+    run_batch(io.StringIO("\n".join(lines) + "\n"), output)
+
+    results = {result["index"]: result for result in map(json.loads, output.getvalue().splitlines())}
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert all("error" in results[i] for i in range(4))
+    assert results[4]["warning_line"] == "return y"
+
+
+def scope_names(parsed, lines):
+    return [
+        None if parsed.scope_at(line) is None else parsed.scope_at(line).name
+        for line in lines
+    ]
+
+
+def test_interval_index_finds_the_innermost_scope():
+    parsed = ParsedFile(NESTED)
+    assert scope_names(parsed, range(1, 19)) == [
+        None, None, None,
+        "top", "top", "top",
+        None, None,
+        "C", "C", "C",
+        "method", "inner", "inner", "method", "method",
+        "C", "C",
+    ]
+    assert parsed.function_at(10) is None
+    assert parsed.function_at(18) is None
+    assert parsed.function_at(14).name == "inner"
+
+
+def test_indentation_fallback_matches_the_parsed_scopes():
+    valid = BROKEN.replace("return x +", "return x")
+    expected = [(s.kind, s.name, s.start, s.end) for s in ParsedFile(valid).scopes]
+    lines = ParsedFile(BROKEN).lines
+    assert [(s.kind, s.name, s.start, s.end) for s in collect_scopes_by_indent(lines)] == expected
+
+
+def test_indentation_fallback_keeps_decorators_and_strings_in_scope():
+    parsed = ParsedFile(BROKEN)
+    assert parsed.function_at(7).name == "f"
+    assert parsed.function_at(16).name == "g"
+    assert parsed.scope_source(parsed.function_at(16)) == (
+        "@property\ndef g(self):\n    return (\n1)"
+    )
+    assert extract_from_parsed(parsed, "E [1]", "m", 9, 0)["source_code"].startswith(
+        "@decorator(\n    name="
+    )
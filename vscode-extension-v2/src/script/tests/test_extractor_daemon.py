@@ -0,0 +1,29 @@
+import json
+
+from extractor_daemon import INTERNAL_ERROR, ExtractorService, ParseCache
+
+
+def call(service, method, params):
+    return service.handle_line(
+        json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+    )
+
+
+def test_invalid_records_get_per_record_errors():
+    service = ExtractorService(ParseCache(8, 1 << 20))
+    batch = call(service, "extract_batch", {"errors": [1]})["result"]
+    assert batch == [{"index": 0, "error": "record is not a JSON object"}]
+    incremental = call(service, "extract_incremental", {"errors": ["x"]})["result"]
+    assert incremental["stats"]["failed"] == 1
+
+
+def test_unexpected_exceptions_become_internal_errors():
+    service = ExtractorService(ParseCache(8, 1 << 20))
+
+    def broken(params):
+        raise AttributeError("boom")
+
+    service.methods["stats"] = broken
+    response = call(service, "stats", {})
+    assert response["error"]["code"] == INTERNAL_ERROR
+    assert service.running